@@ -0,0 +1,80 @@
+"""
+File: alignment.py
+Author: AleNriG
+Email: agorokhov94@gmail.com
+Github: https://github.com/alenrig
+Description: Alignment of repeat profiles before averaging. Crater depth
+errors shift repeats of one sample against each other, so point by point mean
+is smeared. Shift of every repeat against the reference is found by FFT
+cross-correlation with parabolic refinement of the peak (sub-point shift),
+then repeats are resampled by linear interpolation, all rows at once.
+
+Usage:
+    lags = alignment.shifts(reference, signals)
+    aligned = alignment.resample(signals, lags)
+"""
+import numpy as np
+
+
+def _fft_size(length):
+    """Power of two for linear (not circular) correlation."""
+    return 1 << (2 * length - 1).bit_length()
+
+
+def shifts(reference, signals, max_shift=None):
+    """Shifts of signals against reference in points, positive if signal is
+    late: signal[i] ~ reference[i - shift].
+
+    :reference: 1d array.
+    :signals: 2d array, rows of reference length.
+    :max_shift: max absolute shift in points, quarter of length by default.
+    :returns: array of shifts for every row.
+
+    """
+    signals = np.atleast_2d(signals)
+    length = signals.shape[1]
+    if max_shift is None:
+        max_shift = length // 4
+    max_shift = max(1, min(int(max_shift), length - 1))
+
+    size = _fft_size(length)
+    # background is removed, mean removal would bias the peak to zero lag
+    reference_spectrum = np.fft.rfft(reference - np.min(reference), size)
+    spectrums = np.fft.rfft(signals - signals.min(axis=1, keepdims=True), size, axis=1)
+    correlation = np.fft.irfft(spectrums * np.conj(reference_spectrum), size, axis=1)
+    # lags -max_shift ... max_shift
+    correlation = np.concatenate(
+        [correlation[:, -max_shift:], correlation[:, : max_shift + 1]], axis=1
+    )
+    rows = np.arange(len(signals))
+    peaks = np.argmax(correlation, axis=1)
+
+    inner = np.clip(peaks, 1, correlation.shape[1] - 2)
+    left = correlation[rows, inner - 1]
+    center = correlation[rows, inner]
+    right = correlation[rows, inner + 1]
+    curvature = left - 2 * center + right
+    with np.errstate(invalid="ignore", divide="ignore"):
+        refinement = np.where(curvature < 0, 0.5 * (left - right) / curvature, 0.0)
+    refinement[inner != peaks] = 0.0
+    return peaks - max_shift + refinement
+
+
+def resample(signals, lags):
+    """Move every row back by its shift: aligned[i] = signal[i + shift],
+    linear interpolation between points, nan outside of the row.
+
+    :signals: 2d array.
+    :lags: shifts from shifts().
+    :returns: 2d array of aligned signals.
+
+    """
+    signals = np.atleast_2d(signals)
+    length = signals.shape[1]
+    positions = np.arange(length) + np.asarray(lags, dtype=float)[:, None]
+    left = np.clip(np.floor(positions).astype(int), 0, length - 2)
+    weights = positions - left
+    rows = np.arange(len(signals))[:, None]
+    aligned = signals[rows, left] * (1 - weights) + signals[rows, left + 1] * weights
+    aligned[(positions < 0) | (positions > length - 1)] = np.nan
+    return aligned
@@ -0,0 +1,88 @@
+"""
+File: cache.py
+Author: AleNriG
+Email: agorokhov94@gmail.com
+Github: https://github.com/alenrig
+Description: Persistent on-disk cache of derived results. Key is a hash of
+everything the result depends on (arrays by content, numbers by value), so
+changing one ion's RSF invalidates only this ion's entry, and entries of
+changed files are never found again.
+
+Usage:
+    key = cache.key(depth, ion, matrix, ia, rsf, bad_points)
+    results = cache.load(key)
+    if results is None:
+        results = {...}
+        cache.store(key, results)
+"""
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+
+CACHE_DIR = ".sims_cache"
+VERSION = b"4"
+
+
+def key(*parts):
+    """Hash of arrays and values.
+
+    :returns: hex digest.
+
+    """
+    digest = hashlib.sha256(VERSION)
+    for part in parts:
+        if isinstance(part, np.ndarray):
+            part = np.ascontiguousarray(part)
+            digest.update(str((part.dtype, part.shape)).encode())
+            digest.update(part.tobytes())
+        else:
+            digest.update(repr(part).encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _path(cache_key, cache_dir):
+    return os.path.join(cache_dir, cache_key[:2], cache_key + ".npz")
+
+
+def load(cache_key, cache_dir=CACHE_DIR):
+    """Return dict stored under cache_key or None.
+    Scalars are returned as python numbers.
+
+    """
+    path = _path(cache_key, cache_dir)
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as stored:
+            return {
+                name: stored[name].item() if stored[name].ndim == 0 else stored[name]
+                for name in stored.files
+            }
+    except (OSError, ValueError, KeyError):
+        # broken entry, e.g. after crash of another process
+        return None
+
+
+def store(cache_key, results, cache_dir=CACHE_DIR):
+    """Save dict of arrays and numbers under cache_key atomically."""
+    path = _path(cache_key, cache_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".npz")
+    try:
+        with os.fdopen(descriptor, "wb") as file:
+            np.savez(file, **results)
+        os.replace(temporary, path)
+    except BaseException:
+        os.remove(temporary)
+        raise
+
+
+def clear(cache_dir=CACHE_DIR):
+    """Remove all entries."""
+    for root, _, files in os.walk(cache_dir):
+        for name in files:
+            if name.endswith(".npz"):
+                os.remove(os.path.join(root, name))
@@ -0,0 +1,201 @@
+"""
+File: chunked.py
+Author: AleNriG
+Email: agorokhov94@gmail.com
+Github: https://github.com/alenrig
+Description: Out-of-core processing of very long profiles. File.csv from
+converter.py is streamed by blocks of rows through depth and concentration
+calculation, dose integration and Rp, ΔRp, γ and β moments accumulation.
+State is carried across blocks borders, so memory is bounded by the block
+size and results are the same as of statistics.Session.measure().
+"""
+import csv
+from itertools import islice
+
+import numpy as np
+
+CHUNK_SIZE = 100000
+
+
+def read_chunks(input_file, chunk_size=CHUNK_SIZE):
+    """Read file.csv by blocks of rows.
+
+    :yields: dict('time': [...], 'ion 1': [...], etc) for every block.
+
+    """
+    with open(input_file, "r") as file:
+        legend = next(csv.reader([file.readline()]))
+        while True:
+            lines = list(islice(file, chunk_size))
+            if not lines:
+                break
+            points = np.loadtxt(lines, delimiter=",", ndmin=2)
+            yield {label: points[:, number] for number, label in enumerate(legend)}
+
+
+class _DepthStream:
+    """Depth of consecutive blocks: time * speed or composition dependent
+    speed integrated over time (see depth.composition_depths)."""
+
+    def __init__(self, speed=None, calibration=None):
+        self.speed = speed
+        self.calibration = calibration
+        self.last = None  # (time, rate, depth) of the previous block end
+
+    def __call__(self, chunk):
+        if self.calibration is None:
+            return chunk["time"] * self.speed
+        calibration = self.calibration
+        time = chunk["time"]
+        ratio = chunk[calibration["ion"]] / chunk[calibration["matrix"]]
+        rate = np.interp(ratio, calibration["ratio"], calibration["speed"])
+        if self.last is None:
+            start = time[0] * rate[0]
+        else:
+            last_time, last_rate, last_depth = self.last
+            start = last_depth + (rate[0] + last_rate) / 2 * (time[0] - last_time)
+        steps = np.empty_like(time)
+        steps[0] = start
+        steps[1:] = (rate[1:] + rate[:-1]) / 2 * np.diff(time)
+        depth = np.cumsum(steps)
+        self.last = time[-1], rate[-1], depth[-1]
+        return depth
+
+
+class _IonAccumulator:
+    """Running sums for dose and moments of one ion over points after bad
+    ones, as in statistics._concentration and statistics._reper_point.
+    Dose is trapz on the depth grid. Moments of blocks are merged by
+    concentration weight, mean depth and central sums of 2nd to 4th powers
+    of deviations from it (Chan et al. and Pebay updates), so there is no
+    cancellation of large sums.
+    """
+
+    def __init__(self):
+        self.dose = 0.0
+        self.last = None  # (depth, concentration) of the last good point
+        self.weight = 0.0
+        self.mean = 0.0
+        self.central = np.zeros(3)  # Σ (x - mean) ** k * C for k = 2, 3, 4
+
+    def add(self, depth, concentration, good):
+        """good - mask of points after bad ones."""
+        if not good.any():
+            return
+        depth, concentration = depth[good], concentration[good]
+        if self.last is None:
+            good_depth, good_concentration = depth, concentration
+        else:
+            good_depth = np.concatenate(([self.last[0]], depth))
+            good_concentration = np.concatenate(([self.last[1]], concentration))
+        self.dose += np.sum(
+            (good_concentration[1:] + good_concentration[:-1]) / 2 * np.diff(good_depth)
+        )
+        self.last = depth[-1], concentration[-1]
+
+        weight = concentration.sum()
+        if weight == 0:
+            return
+        mean = (depth * concentration).sum() / weight
+        shifted = depth - mean
+        m2, m3, m4 = ((shifted ** k * concentration).sum() for k in (2, 3, 4))
+        a2, a3, a4 = self.central
+        wa, wb = self.weight, weight
+        total = wa + wb
+        delta = mean - self.mean
+        self.central = np.array(
+            [
+                a2 + m2 + delta ** 2 * wa * wb / total,
+                a3
+                + m3
+                + delta ** 3 * wa * wb * (wa - wb) / total ** 2
+                + 3 * delta * (wa * m2 - wb * a2) / total,
+                a4
+                + m4
+                + delta ** 4 * wa * wb * (wa ** 2 - wa * wb + wb ** 2) / total ** 3
+                + 6 * delta ** 2 * (wa ** 2 * m2 + wb ** 2 * a2) / total ** 2
+                + 4 * delta * (wa * m3 - wb * a3) / total,
+            ]
+        )
+        self.mean += delta * wb / total
+        self.weight = total
+
+    def result(self):
+        """Return dose, Rp, ΔRp, γ, β."""
+        m2, m3, m4 = self.central / self.weight
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self.dose, self.mean, np.sqrt(m2), m3 / m2 ** 1.5, m4 / m2 ** 2
+
+
+def measure(
+    input_file,
+    ions,
+    parameters,
+    speed=None,
+    bad_points=0,
+    chunk_size=CHUNK_SIZE,
+    output_file=None,
+):
+    """Streamed analogue of statistics.Session.measure().
+
+    :input_file: file.csv
+    :ions: ions to calculate (without matrix).
+    :parameters: parameters of statistics.Session
+    :speed: erosion speed, 'speed calibration' of parameters is used if None,
+    as in statistics.Session.measure().
+    :bad_points: number of first bad points.
+    :chunk_size: number of rows in block.
+    :output_file: if given, depth and concentrations are written there
+    block by block.
+    :returns: dict('filename': ..., 'ion 1 dose': ..., 'ion 1 Rp': ...,
+    'ion 1 ΔRp': ..., 'ion 1 γ': ..., 'ion 1 β': ..., etc)
+
+    """
+    # statistics imports this module, so its helpers are imported on call
+    from statistics import _strip_ion_name
+
+    matrix = parameters["matrix"]
+    calibration = parameters.get("speed calibration") if speed is None else None
+    depth_stream = _DepthStream(speed, calibration)
+    accumulators = {}
+    points = 0
+    writer, file = None, None
+    try:
+        for chunk in read_chunks(input_file, chunk_size):
+            depth = depth_stream(chunk)
+            good = np.arange(points, points + len(depth)) >= bad_points
+            points += len(depth)
+
+            columns = {"depth": depth}
+            for ion in ions:
+                if ion in chunk:
+                    ion_name = _strip_ion_name(ion)
+                    columns[ion_name] = (
+                        chunk[ion]
+                        / parameters[ion + " IA"]
+                        / chunk[matrix]
+                        * parameters[ion + " RSF"]
+                    )
+                    accumulators.setdefault(ion_name, _IonAccumulator()).add(
+                        depth, columns[ion_name], good
+                    )
+
+            if output_file is not None:
+                if writer is None:
+                    file = open(output_file, "w")
+                    writer = csv.writer(file)
+                    writer.writerow(columns)
+                writer.writerows(np.column_stack(list(columns.values())))
+    finally:
+        if file is not None:
+            file.close()
+
+    data = dict(filename=input_file.rsplit("_", 1)[0])
+    for ion_name, accumulator in accumulators.items():
+        dose, rp, delta_rp, gamma, beta = accumulator.result()
+        data[ion_name + " dose"] = dose
+        data[ion_name + " Rp"] = rp
+        data[ion_name + " ΔRp"] = delta_rp
+        data[ion_name + " γ"] = gamma
+        data[ion_name + " β"] = beta
+    return data
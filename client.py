@@ -0,0 +1,99 @@
+"""
+File: client.py
+Author: AleNriG
+Email: agorokhov94@gmail.com
+Github: https://github.com/alenrig
+Description: Thin command line client of daemon.py. Sends one request and
+prints the answer, nothing heavy is imported.
+
+Usage:
+    python client.py session SESSION_JSON       # {"ions": [...], "parameters": {...}}
+    python client.py measure SPEED FILE...      # SPEED '-' for speed calibration
+    python client.py mean SPEED FILE...
+    python client.py export SPEED FILE...
+    python client.py fit PARAMS_FILE INPUT_FILE
+    python client.py stats | invalidate | shutdown
+Socket is taken from SIMS_SOCKET environment variable, as in daemon.py.
+"""
+import json
+import os
+import socket
+import sys
+import tempfile
+
+SOCKET_PATH = os.environ.get(
+    "SIMS_SOCKET", os.path.join(tempfile.gettempdir(), f"sims-{os.getuid()}.sock")
+)
+
+
+def print_usage():
+    print(__doc__.split("Usage:\n", 1)[1])
+
+
+def request(message, socket_path=SOCKET_PATH):
+    """Send one request to daemon.
+
+    :message: dict('command': ..., etc)
+    :returns: result of request.
+
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(socket_path)
+        connection.sendall((json.dumps(message) + "\n").encode())
+        with connection.makefile("rb") as answer_file:
+            answer = json.loads(answer_file.readline())
+    if not answer["ok"]:
+        raise RuntimeError(answer["error"])
+    return answer["result"]
+
+
+def _speed(argument):
+    return None if argument == "-" else float(argument)
+
+
+def _files(arguments):
+    return [os.path.abspath(path) for path in arguments]
+
+
+def build_request(arguments):
+    """Request for command line arguments (without program name)."""
+    command, arguments = arguments[0], arguments[1:]
+    if command == "session" and len(arguments) == 1:
+        with open(arguments[0]) as file:
+            message = json.load(file)
+        calibration = message.get("parameters", {}).get("speed calibration")
+        if isinstance(calibration, str):
+            message["parameters"]["speed calibration"] = os.path.abspath(calibration)
+        return dict(message, command="session")
+    if command in ("measure", "mean", "export") and len(arguments) >= 2:
+        message = dict(
+            command=command, speed=_speed(arguments[0]), files=_files(arguments[1:])
+        )
+        if command == "export":
+            message["directory"] = os.getcwd()
+        return message
+    if command == "fit" and len(arguments) == 2:
+        with open(arguments[0]) as file:
+            params = list(map(float, file.read().split()))
+        return dict(command="fit", params=params, file=os.path.abspath(arguments[1]))
+    if command in ("stats", "invalidate", "shutdown") and not arguments:
+        return dict(command=command)
+    return None
+
+
+def main():
+    message = build_request(sys.argv[1:]) if len(sys.argv) > 1 else None
+    if message is None:
+        print_usage()
+        exit(1)
+    try:
+        result = request(message)
+    except (OSError, RuntimeError) as error:
+        print(error, file=sys.stderr)
+        exit(1)
+    if result is not None:
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,21 +2,25 @@
 import csv
 import os
 
+import profiling
+
 
 def read_file(file_input):
-    with open(file_input, "r") as file:
+    with profiling.stage("read_file") as stage, open(file_input, "r") as file:
         full_file = []
         for line in file.read().splitlines():
             full_file.append(line)
+        stage.add(bytes_read=file.tell())
     return full_file
 
 
 def write_file(output_path, names, data):
-    with open(output_path, "w") as csvfile:
+    with profiling.stage("write_file") as stage, open(output_path, "w") as csvfile:
         writer = csv.writer(csvfile)
         writer.writerow(names)
         for line in data:
             writer.writerow(line)
+        stage.add(bytes_written=csvfile.tell(), items=len(data))
 
 
 def files_grubber():
@@ -65,17 +69,19 @@ if __name__ == "__main__":
         head.insert(0, "time")
 
         # чтение экспериментальных данных
-        grid, data = [], []
-        for line in datapoints:
-            x, *y = map(float, line.split())
-            # удаление дополнительных столбцов времён
-            y = y[0::2]
-            grid.append(x)
-            data.append(y)
-
-        # добавление в финальный файл столбец времени
-        for i, j in enumerate(grid):
-            data[i].insert(0, grid[i])
+        with profiling.stage("parse") as stage:
+            grid, data = [], []
+            for line in datapoints:
+                x, *y = map(float, line.split())
+                # удаление дополнительных столбцов времён
+                y = y[0::2]
+                grid.append(x)
+                data.append(y)
+
+            # добавление в финальный файл столбец времени
+            for i, j in enumerate(grid):
+                data[i].insert(0, grid[i])
+            stage.add(items=len(grid) * len(head))
 
         # запись файла с именами столбцов
         file_output = output_file_prefix + ".csv"
@@ -0,0 +1,145 @@
+"""
+File: cube.py
+Author: AleNriG
+Email: agorokhov94@gmail.com
+Github: https://github.com/alenrig
+Description: Dense result cube of sample x measurement x ion x quantity
+(dose, area, Rp, ΔRp, peak concentration). Filled from a directory once,
+queried and reduced per sample, measurement or ion without recalculation,
+saved in compact .npz form.
+
+Usage:
+    session = statistics.Session(...)
+    results = cube.ResultCube.from_directory(session, speed=0.5)
+    results.mean(("sample", "ion"))   # shape (samples, ions, quantities)
+    results.std("ion", "dose")        # shape (ions,)
+    results.save("results.npz")
+"""
+import numpy as np
+
+import loader
+import statistics
+
+QUANTITIES = ("dose", "area", "Rp", "ΔRp", "peak")
+AXES = ("sample", "measurement", "ion")
+
+
+class ResultCube:
+    """Results of many measurements.
+
+    :samples: list of sample IDs.
+    :measurements: 2d array (samples x measurements) of measurement names,
+    '' where sample has less measurements.
+    :ions: list of ion names.
+    :values: array (samples x measurements x ions x QUANTITIES), nan where
+    there is no result.
+
+    """
+
+    def __init__(self, samples, measurements, ions, values):
+        self.samples = list(samples)
+        self.measurements = np.asarray(measurements, dtype=str)
+        self.ions = list(ions)
+        self.values = np.asarray(values, dtype=float)
+
+    @classmethod
+    def from_directory(cls, session, speed=None):
+        """Measure all datafiles in current directory.
+
+        :session: statistics.Session.
+        :speed: erosion speed for all files, dict(datafile: speed) or None to
+        ask for every file (or use speed calibration of session).
+
+        """
+        samples = {
+            sample: sorted(datafiles, key=statistics._human_sort)
+            for sample, datafiles in statistics._samples().items()
+        }
+        sample_names = sorted(samples, key=statistics._human_sort)
+        width = max(len(datafiles) for datafiles in samples.values())
+        measurements = np.full((len(sample_names), width), "", dtype=object)
+        position = {}
+        for row, sample in enumerate(sample_names):
+            for column, datafile in enumerate(samples[sample]):
+                measurements[row, column] = datafile.split("_")[0]
+                position[datafile.rsplit("_", 1)[0]] = (row, column)
+
+        datafiles = [
+            datafile for sample in sample_names for datafile in samples[sample]
+        ]
+        speeds = speed if isinstance(speed, dict) else dict.fromkeys(datafiles, speed)
+        names = {datafile.rsplit("_", 1)[0]: datafile for datafile in datafiles}
+        ion_number = {
+            ion_name: number for number, ion_name in enumerate(session.ion_names)
+        }
+
+        # collect indexes and values, fill the cube at once
+        rows, columns, ion_indexes, quantities = [], [], [], []
+        for data in loader.load(datafiles):
+            data = session.measure(data=data, speed=speeds[names[data["filename"]]])
+            areas = session._area_calculator(data)
+            row, column = position[data["filename"]]
+            for ion, ion_name in zip(session.ions, session.ion_names):
+                if ion_name in data:
+                    rows.append(row)
+                    columns.append(column)
+                    ion_indexes.append(ion_number[ion_name])
+                    quantities.append(
+                        [
+                            data[ion_name + " dose"],
+                            areas[ion],
+                            data[ion_name + " Rp"],
+                            data[ion_name + " ΔRp"],
+                            data[ion_name].max(),
+                        ]
+                    )
+        values = np.full(
+            (len(sample_names), width, len(session.ion_names), len(QUANTITIES)), np.nan
+        )
+        values[rows, columns, ion_indexes] = quantities
+        return cls(sample_names, measurements.astype(str), session.ion_names, values)
+
+    def get(self, quantity):
+        """Array (samples x measurements x ions) of one quantity."""
+        return self.values[..., QUANTITIES.index(quantity)]
+
+    def _reduce(self, function, by, quantity):
+        by = (by,) if isinstance(by, str) else tuple(by)
+        axes = tuple(number for number, axis in enumerate(AXES) if axis not in by)
+        values = self.values if quantity is None else self.get(quantity)
+        with np.errstate(invalid="ignore"):
+            return function(values, axis=axes)
+
+    def mean(self, by=("sample", "ion"), quantity=None):
+        """Mean grouped by axes: 'sample', 'measurement', 'ion' or a tuple of
+        them. Other axes are reduced, e.g. by ('sample', 'ion') result is
+        (samples x ions x quantities), or (samples x ions) for one quantity.
+
+        """
+        return self._reduce(np.nanmean, by, quantity)
+
+    def std(self, by=("sample", "ion"), quantity=None):
+        """Std grouped like mean()."""
+        return self._reduce(np.nanstd, by, quantity)
+
+    def save(self, output_file):
+        np.savez_compressed(
+            output_file,
+            samples=np.array(self.samples, dtype=str),
+            measurements=self.measurements,
+            ions=np.array(self.ions, dtype=str),
+            quantities=np.array(QUANTITIES, dtype=str),
+            values=self.values,
+        )
+
+    @classmethod
+    def load(cls, input_file):
+        with np.load(input_file) as stored:
+            if tuple(stored["quantities"]) != QUANTITIES:
+                raise ValueError("cube was saved with other quantities")
+            return cls(
+                stored["samples"],
+                stored["measurements"],
+                stored["ions"],
+                stored["values"],
+            )
@@ -0,0 +1,304 @@
+"""
+File: daemon.py
+Author: AleNriG
+Email: agorokhov94@gmail.com
+Github: https://github.com/alenrig
+Description: Long-lived analysis process on a local Unix socket. Keeps
+parsed profiles, parameter sets (statistics.Session), measure results and
+delta-layer trial responses in memory, so repeat requests take milliseconds
+instead of new imports, reading and kernel building. Entries of a file are
+dropped when its modification time or size changes. Only the last
+MAX_RESPONSES sets of trial responses (tens of MB each) are kept.
+
+Protocol: one JSON object per line, answer is one JSON line
+{"ok": true, "result": ...} or {"ok": false, "error": "..."}. Requests:
+    {"command": "session", "name": "default", "ions": [...], "parameters": {...},
+     "bad_points": 0}
+    {"command": "measure", "files": [...], "speed": 0.5, "session": "default"}
+    {"command": "mean", "files": [...], "speed": 0.5, "sample": null}
+    {"command": "export", "files": [...], "speed": 0.5, "directory": "."}
+    {"command": "fit", "file": "...", "params": [lambda_g, lambda_d, sigma, K]}
+    {"command": "stats"}, {"command": "invalidate"}, {"command": "shutdown"}
+Paths must be absolute (client.py does it). Speed null means speed
+calibration of the session.
+
+Usage:
+    python daemon.py [SOCKET]
+"""
+import contextlib
+import importlib
+import io
+import json
+import os
+import socket
+import socketserver
+import sys
+import tempfile
+from collections import OrderedDict
+
+import numpy as np
+
+import depth
+import export
+import loader
+import statistics
+
+SOCKET_PATH = os.environ.get(
+    "SIMS_SOCKET", os.path.join(tempfile.gettempdir(), f"sims-{os.getuid()}.sock")
+)
+MAX_RESPONSES = 4
+
+
+def print_usage():
+    print("usage: " + sys.argv[0] + " [SOCKET]")
+
+
+def _signature(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _scalars(data):
+    """Numbers and names of result, profiles are skipped."""
+    return {
+        name: value.item() if isinstance(value, np.generic) else value
+        for name, value in data.items()
+        if not isinstance(value, (np.ndarray, dict))
+    }
+
+
+class State:
+    """Everything kept between requests."""
+
+    def __init__(self):
+        self.sessions = {}
+        self.profiles = {}  # path: (signature, data)
+        self.results = {}  # (path, session name, speed): (signature, data)
+        self.responses = OrderedDict()  # (params, grid): trial responses, LRU
+        self.fitting = None
+        self.hits = self.misses = 0
+
+    def session(self, name):
+        if name not in self.sessions:
+            raise ValueError(f"no session '{name}', send 'session' command first")
+        return self.sessions[name]
+
+    def profile(self, path):
+        """Parsed file.csv, read again if file was changed."""
+        signature = _signature(path)
+        cached = self.profiles.get(path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        with open(path, "rb") as file:
+            data = loader.parse_csv(os.path.basename(path), file.read())
+        self.profiles[path] = signature, data
+        for key in [key for key in self.results if key[0] == path]:
+            del self.results[key]
+        return data
+
+    def measure(self, path, name, speed):
+        session = self.session(name)
+        if speed is None and "speed calibration" not in session.parameters:
+            raise ValueError("speed is needed without speed calibration")
+        key = path, name, speed
+        signature = _signature(path)
+        cached = self.results.get(key)
+        if cached is not None and cached[0] == signature:
+            self.hits += 1
+            return cached[1]
+        self.misses += 1
+        data = dict(self.profile(path))
+        with contextlib.redirect_stdout(io.StringIO()):
+            data = session.measure(data=data, speed=speed)
+        self.results[key] = signature, data
+        return data
+
+    def fitting_module(self):
+        """gauss_fitting/delta_layer.py, imported on first fit."""
+        if self.fitting is None:
+            self.fitting = importlib.import_module("gauss_fitting.delta_layer")
+        return self.fitting
+
+    def trial_responses(self, params, fit_grid):
+        fitting = self.fitting_module()
+        key = tuple(params), fit_grid[0], fit_grid[-1], len(fit_grid)
+        if key not in self.responses:
+            self.misses += 1
+            kernel = fitting.ImpulseFunctionCreator(params).create_truncated(fit_grid)
+            self.responses[key] = fitting.trial_responses(
+                kernel,
+                fit_grid,
+                np.arange(fitting.MINDEPTH, fitting.MAXDEPTH, fitting.DEPTHSTEP),
+                np.arange(fitting.MINWIDTH, fitting.MAXWIDTH, fitting.WIDTHSTEP),
+            )
+            while len(self.responses) > MAX_RESPONSES:
+                self.responses.popitem(last=False)
+        else:
+            self.hits += 1
+            self.responses.move_to_end(key)
+        return self.responses[key]
+
+    def invalidate(self):
+        self.profiles.clear()
+        self.results.clear()
+        self.responses.clear()
+
+
+def command_session(state, request):
+    parameters = dict(request["parameters"])
+    calibration = parameters.get("speed calibration")
+    if isinstance(calibration, str):
+        parameters["speed calibration"] = depth.read_speed_calibration(calibration)
+    name = request.get("name", "default")
+    state.sessions[name] = statistics.Session(
+        request["ions"], parameters, request.get("bad_points", 0)
+    )
+    for key in [key for key in state.results if key[1] == name]:
+        del state.results[key]
+    return None
+
+
+def _measures(state, request):
+    return [
+        state.measure(path, request.get("session", "default"), request.get("speed"))
+        for path in request["files"]
+    ]
+
+
+def command_measure(state, request):
+    return [_scalars(data) for data in _measures(state, request)]
+
+
+def command_mean(state, request):
+    session = state.session(request.get("session", "default"))
+    with contextlib.redirect_stdout(io.StringIO()):
+        means = session.mean(*_measures(state, request), sample=request.get("sample"))
+    return _scalars(means)
+
+
+def command_export(state, request):
+    session = state.session(request.get("session", "default"))
+    paths = []
+    for data in _measures(state, request):
+        paths += export.write(
+            data,
+            os.path.join(request.get("directory", "."), data["filename"]),
+            request.get("formats", session.parameters["export formats"]),
+            session.ion_names,
+        )
+    return paths
+
+
+def command_fit(state, request):
+    fitting = state.fitting_module()
+    params = request["params"]
+    grid, data = fitting.read_data(request["file"])
+    centered_grid, mid_x = fitting.center_grid(grid, data)
+    fit_grid = fitting.adaptive_grid(centered_grid, params)
+    response = np.interp(fit_grid, centered_grid, data)
+    trials, responses = state.trial_responses(params, fit_grid)
+    dose = fitting.integrate(response, fit_grid)
+    best = fitting._best_trials(response[None, :], np.array([dose]), responses)[0]
+    return dict(
+        depth=float(trials[best, 0]),
+        width=float(trials[best, 1]),
+        dose=float(dose),
+        center=float(mid_x),
+        points=len(fit_grid),
+    )
+
+
+def command_stats(state, request):
+    return dict(
+        sessions=list(state.sessions),
+        profiles=len(state.profiles),
+        results=len(state.results),
+        kernels=len(state.responses),
+        hits=state.hits,
+        misses=state.misses,
+    )
+
+
+def command_invalidate(state, request):
+    state.invalidate()
+    return None
+
+
+COMMANDS = dict(
+    session=command_session,
+    measure=command_measure,
+    mean=command_mean,
+    export=command_export,
+    fit=command_fit,
+    stats=command_stats,
+    invalidate=command_invalidate,
+)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                command = request["command"]
+                if command == "shutdown":
+                    answer = dict(ok=True, result=None)
+                    self.server.stopping = True
+                elif command not in COMMANDS:
+                    raise ValueError(f"unknown command '{command}'")
+                else:
+                    result = COMMANDS[command](self.server.state, request)
+                    answer = dict(ok=True, result=result)
+            except Exception as error:  # answered to client, daemon keeps working
+                answer = dict(ok=False, error=f"{type(error).__name__}: {error}")
+            self.wfile.write((json.dumps(answer, default=float) + "\n").encode())
+            self.wfile.flush()
+
+
+def _answers(socket_path):
+    """True if something listens on socket_path."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(socket_path)
+        except OSError:
+            return False
+    return True
+
+
+class Server(socketserver.UnixStreamServer):
+    """One request at a time, so state needs no locks."""
+
+    def __init__(self, socket_path=SOCKET_PATH):
+        if os.path.exists(socket_path):
+            if _answers(socket_path):
+                raise RuntimeError(f"daemon is already running on {socket_path}")
+            os.remove(socket_path)  # left by killed daemon
+        super().__init__(socket_path, _Handler)
+        self.socket_path = socket_path
+        self.state = State()
+        self.stopping = False
+
+    def serve(self):
+        try:
+            while not self.stopping:
+                self.handle_request()
+        finally:
+            self.server_close()
+            os.remove(self.socket_path)
+
+
+def main():
+    if len(sys.argv) > 2:
+        print_usage()
+        exit(1)
+    try:
+        server = Server(sys.argv[1] if len(sys.argv) == 2 else SOCKET_PATH)
+    except RuntimeError as error:
+        print(error, file=sys.stderr)
+        exit(1)
+    print("listening on " + server.socket_path)
+    server.serve()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+File: decay_length.py
+Author: AleNriG
+Email: agorokhov94@gmail.com
+Github: https://github.com/alenrig
+Description: Automatic decay length extraction from trailing edges of
+profiles. Replaces picking of two points by hand in small/decay.py.
+
+The trailing edge of every ion is the part after the maximum where signal
+fell by e times and is still well above the background. In log space the edge
+is a line, it is fitted by robust (Tukey biweight) linear regression. All
+files and ions are stacked into one array and fitted at once.
+
+Usage:
+    datas = [session.measure(datafile) for datafile in ...]
+    lengths = session.decay_lengths(*datas)
+"""
+import warnings
+
+import numpy as np
+
+MIN_POINTS = 5
+ITERATIONS = 5
+TUKEY_C = 4.685
+
+
+def _stack(datas, ion_names, x, bad_points=0):
+    """Stack profiles into 2d arrays padded with nan, arrays are empty if
+    there is no ion in datas. First bad_points of every profile are nan, so
+    surface transients are not taken for the maximum.
+
+    :returns: keys [(filename, ion_name), ...], xs, ys
+
+    """
+    keys, columns = [], []
+    for data in datas:
+        for ion_name in ion_names:
+            if ion_name in data:
+                keys.append((data["filename"], ion_name))
+                columns.append((data[x], data[ion_name]))
+    length = max((len(xs) for xs, _ in columns), default=0)
+    xs = np.full((len(columns), length), np.nan)
+    ys = np.full((len(columns), length), np.nan)
+    for row, (x_column, y_column) in enumerate(columns):
+        xs[row, : len(x_column)] = x_column
+        ys[row, : len(y_column)] = y_column
+    ys[:, :bad_points] = np.nan
+    return keys, xs, ys
+
+
+def _edge_windows(ys, background_part=0.1, background_factor=10):
+    """Mask of trailing edge points of every row.
+    Edge starts where signal fell by e times from the maximum and ends on
+    the first point closer than background_factor to the background, the
+    background is median of the last background_part of the profile.
+
+    """
+    with np.errstate(invalid="ignore", divide="ignore"):
+        log_ys = np.log(np.where(ys > 0, ys, np.nan))
+    lengths = np.sum(~np.isnan(ys), axis=1)
+    index = np.arange(ys.shape[1])
+
+    peaks = np.nanargmax(np.where(np.isnan(log_ys), -np.inf, log_ys), axis=1)
+    peak_levels = log_ys[np.arange(len(ys)), peaks]
+    tails = np.where(
+        index >= (lengths * (1 - background_part)).astype(int)[:, None], log_ys, np.nan
+    )
+    floors = np.nanmedian(tails, axis=1) + np.log(background_factor)
+
+    after_peak = index > peaks[:, None]
+    with np.errstate(invalid="ignore"):
+        below_floor = after_peak & ~(log_ys >= floors[:, None])
+        window = after_peak & (log_ys <= (peak_levels - 1)[:, None])
+    window &= ~np.logical_or.accumulate(below_floor, axis=1)
+    return window, log_ys
+
+
+def _weighted_line(xs, ys, weights):
+    """Weighted least squares line for every row.
+
+    :returns: slopes, intercepts, slopes std
+
+    """
+    xs, ys = np.where(weights > 0, xs, 0), np.where(weights > 0, ys, 0)
+    w_sum = weights.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        x_mean = (weights * xs).sum(axis=1) / w_sum
+        y_mean = (weights * ys).sum(axis=1) / w_sum
+        dx = xs - x_mean[:, None]
+        sxx = (weights * dx ** 2).sum(axis=1)
+        slopes = (weights * dx * (ys - y_mean[:, None])).sum(axis=1) / sxx
+        intercepts = y_mean - slopes * x_mean
+        residuals = ys - intercepts[:, None] - slopes[:, None] * xs
+        dof = np.sum(weights > 0, axis=1) - 2
+        variance = (weights * residuals ** 2).sum(axis=1) / dof
+        slopes_std = np.sqrt(variance / sxx)
+    return slopes, intercepts, slopes_std
+
+
+def fit_edges(xs, ys):
+    """Robust fit of log(ys) trailing edges for every row of 2d arrays.
+
+    :xs: 2d array of depths (or time), rows padded with nan.
+    :ys: 2d array of signals, rows padded with nan.
+    :returns: decay lengths, their std, number of points in windows.
+
+    """
+    window, log_ys = _edge_windows(ys)
+    points = window.sum(axis=1)
+    weights = window.astype(float)
+    for _ in range(ITERATIONS):
+        slopes, intercepts, _ = _weighted_line(xs, log_ys, weights)
+        # rows without edge have empty windows, their lengths are nan
+        with np.errstate(invalid="ignore"), warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            residuals = np.abs(log_ys - intercepts[:, None] - slopes[:, None] * xs)
+            residuals = np.where(window, residuals, np.nan)
+            scale = np.nanmedian(residuals, axis=1) / 0.6745
+            u = residuals / (TUKEY_C * np.where(scale > 0, scale, np.inf))[:, None]
+            weights = np.where(window & (u < 1), (1 - u ** 2) ** 2, 0.0)
+    slopes, _, slopes_std = _weighted_line(xs, log_ys, weights)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        lengths = -1 / slopes
+        lengths_std = slopes_std / slopes ** 2
+    bad = (points < MIN_POINTS) | ~(slopes < 0)
+    lengths[bad] = np.nan
+    lengths_std[bad] = np.nan
+    return lengths, lengths_std, points
+
+
+def decay_lengths(datas, ion_names, x="depth", bad_points=0):
+    """Decay lengths of all ions in all datas.
+
+    :datas: list of dicts from statistics.Session.measure()
+    :ion_names: names of ions to fit.
+    :x: grid key, 'depth' or 'time'.
+    :bad_points: number of first bad points in data.
+    :returns: dict(filename: dict(ion_name: (decay length, std)))
+
+    """
+    keys, xs, ys = _stack(datas, ion_names, x, bad_points)
+    if not keys:
+        return {}
+    lengths, lengths_std, _ = fit_edges(xs, ys)
+    result = {}
+    for (filename, ion_name), length, std in zip(keys, lengths, lengths_std):
+        result.setdefault(filename, {})[ion_name] = (length, std)
+    return result
+
+
+def print_decay_lengths(result):
+    """Print result of decay_lengths()."""
+    for filename, ions in result.items():
+        print(f"{filename:-^15}")
+        for ion_name, (length, std) in ions.items():
+            print(f"{ion_name} decay length = {length:.3g} ± {std:.2g}")
@@ -0,0 +1,72 @@
+"""
+File: decimation.py
+Author: AleNriG
+Email: agorokhov94@gmail.com
+Github: https://github.com/alenrig
+Description: Decimation of profiles before plotting. Dense profiles are
+reduced to a given number of points with no visible difference:
+    'minmax' - minimum and maximum of every bucket, keeps all peaks and
+    dips, works the same for linear and log scales;
+    'lttb' - largest triangle three buckets, keeps the shape.
+The first and the last points are always kept.
+"""
+import numpy as np
+
+
+def minmax(x, y, points):
+    """Indexes of min and max points of points // 2 buckets."""
+    length = len(y)
+    buckets = max(points // 2, 1)
+    size = -(-length // buckets)
+    padded = np.full(buckets * size, np.nan)
+    padded[:length] = y
+    padded = padded.reshape(buckets, size)
+    valid = ~np.all(np.isnan(padded), axis=1)
+    padded = padded[valid]
+    offsets = np.flatnonzero(valid) * size
+    lows = offsets + np.nanargmin(padded, axis=1)
+    highs = offsets + np.nanargmax(padded, axis=1)
+    return np.unique(np.concatenate(([0, length - 1], lows, highs)))
+
+
+def lttb(x, y, points):
+    """Indexes of points chosen by largest triangle three buckets."""
+    length = len(y)
+    edges = np.linspace(1, length - 1, points - 1).astype(int)
+    indexes = np.empty(points, dtype=int)
+    indexes[0], indexes[-1] = 0, length - 1
+    previous = 0
+    for bucket in range(points - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        next_stop = edges[bucket + 2] if bucket + 2 < len(edges) else length
+        next_x = x[stop:next_stop].mean()
+        next_y = y[stop:next_stop].mean()
+        # doubled triangle areas for all candidates of the bucket
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:stop] - y[previous])
+            - (x[previous] - x[start:stop]) * (next_y - y[previous])
+        )
+        previous = start + int(areas.argmax())
+        indexes[bucket + 1] = previous
+    return indexes
+
+
+METHODS = dict(minmax=minmax, lttb=lttb)
+
+
+def decimate(x, y, points, method="minmax"):
+    """Return decimated x and y. If points is None or profile is short -
+    return them as is.
+
+    :x: array of depths.
+    :y: array of concentrations.
+    :points: target number of points.
+    :method: 'minmax' or 'lttb'.
+    :returns: x, y
+
+    """
+    x, y = np.asarray(x), np.asarray(y)
+    if points is None or len(y) <= points or points < 3:
+        return x, y
+    indexes = METHODS[method](x, y, points)
+    return x[indexes], y[indexes]
@@ -3,15 +3,18 @@ import scipy
 from scipy.special import erf
 import matplotlib.pyplot as plt
 
+import profiling
+
 
 #%% read input data
 xGrid = []
 data = []
-with open('original.txt', 'r') as file:
+with profiling.stage('read_data') as stage, open('original.txt', 'r') as file:
     for line in file.read().splitlines():
         x, y = map(float, line.split())
         xGrid.append(x)
         data.append(y)
+    stage.add(bytes_read=file.tell(), items=len(xGrid))
 
 xGrid = numpy.array(xGrid)
 data = numpy.array(data)
@@ -60,33 +63,37 @@ optimalDepth, optimalWidth = 0, 0
 optimalFitFunction = numpy.zeros(len(phiGrid))
 optimalRestoredData = numpy.zeros(len(phiGrid))
 dataInterpolated = numpy.interp(phiGrid, xGridCentered, data)
-for depth, width in [(a, b) for a in depths for b in widths]:
-    print(depth, width)
-    height = fullIntegral / width / numpy.sqrt(numpy.pi)
-    fitFunction = height * numpy.exp(-((phiGrid - depth) / width) ** 2)
-    restoredData = numpy.convolve(transFunction, fitFunction, 'same') * deltaPhi
-    difference = sum((dataInterpolated - restoredData) ** 2)
-    if difference < minDifference:
-        minDifference = difference
-        optimalDepth, optimalWidth = depth, width
-        optimalFitFunction = fitFunction
-        optimalRestoredData = restoredData
-        print(depth, width, 'are new optimal, diff =', difference)
+with profiling.stage('fitting') as stage:
+    for depth, width in [(a, b) for a in depths for b in widths]:
+        print(depth, width)
+        height = fullIntegral / width / numpy.sqrt(numpy.pi)
+        fitFunction = height * numpy.exp(-((phiGrid - depth) / width) ** 2)
+        restoredData = numpy.convolve(transFunction, fitFunction, 'same') * deltaPhi
+        difference = sum((dataInterpolated - restoredData) ** 2)
+        if difference < minDifference:
+            minDifference = difference
+            optimalDepth, optimalWidth = depth, width
+            optimalFitFunction = fitFunction
+            optimalRestoredData = restoredData
+            print(depth, width, 'are new optimal, diff =', difference)
+    stage.add(items=len(depths) * len(widths) * len(phiGrid))
 
 print('suboptimal params are:', optimalDepth, optimalWidth)
-plt.figure()    
-plt.plot(xGridCentered, data)
-plt.plot(phiGrid, optimalFitFunction)
-plt.plot(phiGrid, optimalRestoredData)
-plt.xlabel('offset [nm]')
-plt.ylabel('atomic concentration [cm^{-3}]')
-plt.legend(['Original Signal', 'Fit distribution', 'Calculated Signal'])
-plt.savefig('fitting.pdf')
+with profiling.stage('plot'):
+    plt.figure()
+    plt.plot(xGridCentered, data)
+    plt.plot(phiGrid, optimalFitFunction)
+    plt.plot(phiGrid, optimalRestoredData)
+    plt.xlabel('offset [nm]')
+    plt.ylabel('atomic concentration [cm^{-3}]')
+    plt.legend(['Original Signal', 'Fit distribution', 'Calculated Signal'])
+    plt.savefig('fitting.pdf')
 plt.show()
 
-with open('fit.txt', 'w') as file:
+with profiling.stage('write_data') as stage, open('fit.txt', 'w') as file:
     for x, y in zip(phiGrid + midX, optimalFitFunction):
         file.write(str(x) + ' ' + str(y) + '\n')
+    stage.add(bytes_written=file.tell(), items=len(phiGrid))
 
 
 ##%% interactive fitting
@@ -4,8 +4,8 @@ import sys
 
 import matplotlib.pyplot as plt
 import numpy
-import scipy
-from scipy.special import erf
+
+from gauss_fitting.delta_layer import ImpulseFunctionCreator, adaptive_grid, integrate
 
 
 def read_data(file_path):
@@ -24,55 +24,41 @@ def write_data(file_path, phi_grid, optimal_fitfunction):
             file.write('{} {:e}\n'.format(x, y))
 
 
-def calculate_transfunction(lambda_g, lambda_d, sigma, K):
-    '''Расчет ответной функции по коэффициентам'''
-    a = 1 / lambda_g
-    b = 1 / lambda_d
-    p = 1 / 2 / sigma ** 2
-
-    ksi1_grid = (phi_grid + a / 2 / p) * numpy.sqrt(p)
-    ksi2_grid = (phi_grid - b / 2 / p) * numpy.sqrt(p)
-    transfunction = K * (1 - erf(ksi1_grid)) * numpy.exp(a * phi_grid + a ** 2 / 4 / p)
-    transfunction += (1 + erf(ksi2_grid)) * numpy.exp(-b * phi_grid + b ** 2 / 4 / p)
-    transfunction = transfunction / 2 / (K / a + 1 / b)
-    return transfunction
-
-
 if __name__ == '__main__':
     # проверка аргументов командной строки
     if len(sys.argv) == 3:
         input_path = sys.argv[1]
         output_path = sys.argv[2]
     else:
-        print('usage: {} input_file output_file'.format(sys.argv[0]))
+        print('usage: python -m delta_layer_restore.delta_layer input_file output_file')
         exit(1)
 
     # чтение и нормирование данных
     xgrid, data = read_data(input_path)
-    delta_x = numpy.diff(xgrid).mean()
-    full_integral = numpy.trapz(data) * delta_x
+    full_integral = integrate(data, xgrid)
 
     # центровка данных по точке экстремума
     midx_index = data.argmax()
     midx = xgrid[midx_index]
     xgrid_centered = xgrid - midx
-    minx = min(xgrid_centered)
-    maxx = max(xgrid_centered)
-
-    # set grid
-    phi_grid = scipy.linspace(minx, maxx, num=5000)
-    delta_phi = numpy.diff(phi_grid).mean()
 
     # ответная функция
     lambda_g = float(input('Input lambda g: '))
     lambda_d = float(input('Input lambda d: '))
     sigma = float(input('Input sigma: '))
     K = float(input('Input K: '))
-    transfunction = calculate_transfunction(lambda_g, lambda_d, sigma, K)
+
+    # set grid
+    phi_grid = adaptive_grid(xgrid_centered, (lambda_g, lambda_d, sigma, K))
+    delta_phi = numpy.diff(phi_grid).mean()
+    print('fit grid: {} points instead of 5000'.format(len(phi_grid)))
+    transfunction = ImpulseFunctionCreator((lambda_g, lambda_d, sigma, K)).create_truncated(phi_grid)
+    print('kernel taps: {} of {}, truncation error: {:.2e}'.format(
+        len(transfunction.taps), len(phi_grid), transfunction.error))
 
     # цикл подгона гауссовского распределения к экспериментальным данным
-    depths = scipy.linspace(-50, +50, num=50)
-    widths = scipy.linspace(5, 100, num=20)
+    depths = numpy.linspace(-50, +50, num=50)
+    widths = numpy.linspace(5, 100, num=20)
     min_difference = 1e300
     optimal_depth, optimal_width = 0, 0
     optimal_fitfunction = numpy.zeros(len(phi_grid))
@@ -82,9 +68,7 @@ if __name__ == '__main__':
         print(depth, width)
         height = full_integral / width / numpy.sqrt(numpy.pi)
         fitfunction = height * numpy.exp(-((phi_grid - depth) / width) ** 2)
-        restored_data = delta_phi * numpy.convolve(transfunction,
-                                                   fitfunction,
-                                                   'same')
+        restored_data = delta_phi * transfunction.convolve(fitfunction)
         difference = sum((data_interpolated - restored_data) ** 2)
         if difference < min_difference:
             min_difference = difference
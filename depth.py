@@ -1,8 +1,10 @@
 """Пересчёт скорости травления образца, в зависимости от состава матрицы.
-Необходимо знать индексы точек перехода от одного слоя к другому.
-Необходимо знать скорости травления в каждом слое.
+Необходимо знать индексы точек перехода от одного слоя к другому,
+либо они находятся автоматически по сигналу иона матрицы.
+Необходимо знать скорости травления в каждом слое, либо таблицу
+зависимости скорости травления от отношения сигналов матрицы.
 
-Использование: python3 prog.py file.
+Использование: python3 prog.py file [calibration.csv].
 
 """
 import csv
@@ -13,7 +15,7 @@ import numpy as np
 
 def prog_usage():
     """Печать инструкции использования."""
-    print("Использование: python3", sys.argv[0], "файл данных.")
+    print("Использование: python3", sys.argv[0], "файл данных [таблица скоростей].")
 
 
 def file_read(file_input_path):
@@ -29,13 +31,144 @@ def file_read(file_input_path):
     return data
 
 
+def piecewise_depth(grid, interfaces, speeds):
+    """Depth for multilayer structure in one pass.
+    Erosion speed is constant inside the layer, depth is a cumulative sum
+    of speed * dt over the time grid, so it is continuous on interfaces.
+
+    :grid: array of time points.
+    :interfaces: indexes of the first points of the 2nd, 3rd, etc layers.
+    :speeds: erosion speed of every layer (len(interfaces) + 1 values).
+    :returns: array of depths.
+
+    """
+    grid = np.asarray(grid, dtype=float)
+    interfaces = np.sort(np.asarray(interfaces, dtype=int))
+    speeds = np.asarray(speeds, dtype=float)
+    if len(speeds) != len(interfaces) + 1:
+        raise ValueError("Number of speeds must be number of interfaces + 1.")
+    # layer number of every point
+    layers = np.searchsorted(interfaces, np.arange(len(grid)), side="right")
+    rates = speeds[layers]
+    depth = np.empty_like(grid)
+    depth[0] = grid[0] * rates[0]
+    np.cumsum(rates[:-1] * np.diff(grid), out=depth[1:])
+    depth[1:] += depth[0]
+    return depth
+
+
+def detect_interfaces(matrix, layers=None, min_size=5):
+    """Find layer interfaces as change points of the matrix ion signal.
+    Binary segmentation of log(signal) by mean shift: every split is found
+    in one vectorized pass over cumulative sums of its segment.
+
+    :matrix: matrix ion signal.
+    :layers: number of layers, if None - split while it is statistically
+    significant.
+    :min_size: minimal number of points in a layer.
+    :returns: sorted array of interfaces indexes.
+
+    """
+    signal = np.log(np.clip(np.asarray(matrix, dtype=float), 1e-30, None))
+    n = len(signal)
+    sums = np.concatenate(([0.0], np.cumsum(signal)))
+    # noise level from point to point differences (robust to steps)
+    sigma = np.median(np.abs(np.diff(signal))) / 0.6745 / np.sqrt(2)
+    penalty = 2 * max(sigma ** 2, 1e-12) * np.log(n)
+
+    def best_split(start, stop):
+        splits = np.arange(start + min_size, stop - min_size + 1)
+        if len(splits) == 0:
+            return 0.0, None
+        left, right = splits - start, stop - splits
+        total = sums[stop] - sums[start]
+        left_sum = sums[splits] - sums[start]
+        gain = (
+            left_sum ** 2 / left
+            + (total - left_sum) ** 2 / right
+            - total ** 2 / (stop - start)
+        )
+        best = gain.argmax()
+        return gain[best], splits[best]
+
+    segments = [(0, n) + best_split(0, n)]
+    interfaces = []
+    while layers is None or len(interfaces) < layers - 1:
+        number = max(range(len(segments)), key=lambda i: segments[i][2])
+        start, stop, gain, split = segments[number]
+        if split is None or (layers is None and gain <= penalty):
+            break
+        interfaces.append(split)
+        segments[number : number + 1] = [
+            (start, split) + best_split(start, split),
+            (split, stop) + best_split(split, stop),
+        ]
+    return np.array(sorted(interfaces), dtype=int)
+
+
+def read_speed_calibration(file_input_path):
+    """Read calibration table of erosion speed vs matrix signals ratio.
+    Header of the first column names the ratio, the second is speed:
+        74Ge/28Si,speed
+        0.0,1.2
+        0.5,1.9
+
+    :returns: dict('ion': '74Ge', 'matrix': '28Si', 'ratio': [...],
+    'speed': [...]) sorted by ratio.
+
+    """
+    with open(file_input_path) as file:
+        rows = list(csv.reader(file))
+    ion, matrix = rows.pop(0)[0].replace(" ", "").split("/")
+    table = np.array(rows, dtype=float)
+    table = table[table[:, 0].argsort()]
+    return dict(ion=ion, matrix=matrix, ratio=table[:, 0], speed=table[:, 1])
+
+
+def composition_depths(grids, ions, matrixes, calibration):
+    """Depth with erosion speed depending on matrix composition.
+    Every point signals ratio is turned into instantaneous speed through
+    calibration table, speed is integrated over the time grid by trapezoids.
+    All files are processed in one pass over concatenated arrays.
+
+    :grids: list of time arrays, one for every file.
+    :ions: list of ion signal arrays (ratio numerator).
+    :matrixes: list of matrix signal arrays (ratio denominator).
+    :calibration: dict from read_speed_calibration().
+    :returns: list of depth arrays.
+
+    """
+    lengths = [len(grid) for grid in grids]
+    starts = np.cumsum([0] + lengths[:-1])
+    time = np.concatenate(grids).astype(float)
+    ratio = np.concatenate(ions) / np.concatenate(matrixes)
+    rate = np.interp(ratio, calibration["ratio"], calibration["speed"])
+
+    steps = np.empty_like(time)
+    steps[1:] = (rate[1:] + rate[:-1]) / 2 * np.diff(time)
+    # every file starts from its first point, like time * speed
+    steps[starts] = time[starts] * rate[starts]
+    depth = np.cumsum(steps)
+    depth -= np.repeat(depth[starts] - steps[starts], lengths)
+    return np.split(depth, starts[1:])
+
+
+def composition_depth(data, calibration):
+    """Depth of one file, data is a dict of columns from file_read()."""
+    return composition_depths(
+        [data["time"]],
+        [data[calibration["ion"]]],
+        [data[calibration["matrix"]]],
+        calibration,
+    )[0]
+
+
 class DepthCalculator:
     """Класс расчета списка глубины для гомо- и гетероструктур."""
 
-    control = []
-
     def __init__(self, init=1):
         self.layers = init
+        self.control = []
 
     def _speed_and_control(self):
         """Ввод и проверка значения скорости."""
@@ -59,43 +192,31 @@ class DepthCalculator:
             self.control.append(index)
         return self.control
 
-    def depth(self, grid):
-        list_of_indexes = self._index_and_control()
-        if list_of_indexes == []:
-            speed = self._speed_and_control()
-            depth = [grid[i] * speed for i in range(len(grid))]
+    def depth(self, grid, matrix=None):
+        """Расчет глубины. Если передан сигнал матрицы, индексы смены слоев
+        находятся автоматически, иначе запрашиваются у пользователя."""
+        if matrix is None:
+            list_of_indexes = self._index_and_control()
         else:
-            for layer in range(self.layers):
-                if layer == 0:
-                    speed = self._speed_and_control()
-                    index = list_of_indexes[layer]
-                    depth = [grid[i] for i in range(len(grid[:index]))]
-                elif layer == self.layers - 1:
-                    speed = self._speed_and_control()
-                    index = list_of_indexes[layer - 1]
-                    grid_end = grid[index:]
-                    depth_end = [grid_end[i] * speed for i in range(len(grid_end))]
-                    depth += depth_end
-                else:
-                    speed = self._speed_and_control()
-                    index_left = list_of_indexes[layer - 1]
-                    index_right = list_of_indexes[layer]
-                    grid_middle = grid[index_left:index_right]
-                    depth_middle = [
-                        grid_middle[i] * speed for i in range(len(grid_middle))
-                    ]
-                    depth += depth_middle
-        return depth
+            list_of_indexes = list(detect_interfaces(matrix, self.layers))
+            self.control = list_of_indexes
+            print("Индексы точек смены слоев:", *list_of_indexes)
+        speeds = [self._speed_and_control() for _ in range(len(list_of_indexes) + 1)]
+        return piecewise_depth(grid, list_of_indexes, speeds)
 
 
 if __name__ == "__main__":
 
     data = file_read(sys.argv[1])
+    if len(sys.argv) == 3:
+        data["depth"] = composition_depth(data, read_speed_calibration(sys.argv[2]))
+        sys.exit()
 
     layers = int(input("Введите количество слоев: "))
     while layers <= 0:
         print("Количество слоев не может быть меньше либо равно нулю.")
         layers = int(input("Введите количество слоев: "))
 
+    matrix = input("Ион матрицы для поиска границ слоев (пусто - ввод вручную): ")
     dc = DepthCalculator(layers)
-    data["depth"] = dc.depth(data["time"])
+    data["depth"] = dc.depth(data["time"], data[matrix] if matrix else None)
@@ -0,0 +1,91 @@
+"""
+File: dose_index.py
+Author: AleNriG
+Email: agorokhov94@gmail.com
+Github: https://github.com/alenrig
+Description: Cumulative dose of concentration profiles on their true (not
+averaged) depth grid. With it dose between any depths and depth holding any
+part of the dose are binary search plus linear interpolation, for many
+ions and many queries at once, without new integration.
+
+Usage:
+    cumulative = dose_index.cumulative_dose(depth, concentration, bad_points)
+    dose_index.range_dose(depth, cumulative, [50, 0], [120, 300])
+    dose_index.quantile_depth(depth, cumulative, [0.1, 0.5, 0.9])
+"""
+import numpy as np
+
+
+def cumulative_dose(depth, concentrations, start=0):
+    """Trapezoid integral from depth[start] to every point, zeros before start.
+
+    :depth: 1d array, increasing.
+    :concentrations: 1d array or 2d array (ions x points).
+    :start: first point to integrate from (points before it are bad).
+    :returns: array of concentrations shape.
+
+    """
+    concentrations = np.asarray(concentrations, dtype=float)
+    steps = np.zeros(concentrations.shape)
+    steps[..., start + 1 :] = (
+        (concentrations[..., start + 1 :] + concentrations[..., start:-1])
+        / 2
+        * np.diff(depth[start:])
+    )
+    return np.cumsum(steps, axis=-1)
+
+
+def _interpolate(depth, cumulative, depths):
+    """Cumulative dose at depths, constant out of the grid.
+
+    :returns: array (... x depths)
+
+    """
+    depths = np.clip(np.asarray(depths, dtype=float), depth[0], depth[-1])
+    right = np.clip(np.searchsorted(depth, depths, side="right"), 1, len(depth) - 1)
+    left = right - 1
+    weights = (depths - depth[left]) / (depth[right] - depth[left])
+    return cumulative[..., left] * (1 - weights) + cumulative[..., right] * weights
+
+
+def range_dose(depth, cumulative, starts, stops):
+    """Dose between starts and stops depths.
+
+    :cumulative: from cumulative_dose(), 1d or 2d (ions x points).
+    :starts, stops: arrays of range borders.
+    :returns: array (ions x ranges) or (ranges) for 1d cumulative.
+
+    """
+    return _interpolate(depth, cumulative, stops) - _interpolate(
+        depth, cumulative, starts
+    )
+
+
+def quantile_depth(depth, cumulative, quantiles):
+    """Depths above which given parts of the total dose lie, e.g. 0.9 gives
+    depth holding 90% of dose.
+
+    :cumulative: from cumulative_dose(), 1d or 2d (ions x points).
+    :quantiles: array of parts of dose from 0 to 1.
+    :returns: array (ions x quantiles) or (quantiles) for 1d cumulative.
+
+    """
+    cumulative = np.asarray(cumulative, dtype=float)
+    rows = np.atleast_2d(cumulative)
+    quantiles = np.asarray(quantiles, dtype=float)
+    parts = rows / rows[:, -1:]
+    # rows are shifted by their number to search all of them in one flat array
+    offsets = np.arange(len(rows))[:, None]
+    flat = (parts + offsets).ravel()
+    targets = np.clip(quantiles, 0, 1) + offsets
+    points = rows.shape[1]
+    right = np.searchsorted(flat, targets.ravel(), side="left").reshape(targets.shape)
+    right = np.clip(right, offsets * points + 1, (offsets + 1) * points - 1).ravel()
+    left = right - 1
+    columns = right % points
+    with np.errstate(invalid="ignore", divide="ignore"):
+        weights = (targets.ravel() - flat[left]) / (flat[right] - flat[left])
+    weights = np.clip(np.nan_to_num(weights), 0, 1)
+    result = depth[columns - 1] * (1 - weights) + depth[columns] * weights
+    result = result.reshape(len(rows), len(quantiles))
+    return result if cumulative.ndim == 2 else result[0]
@@ -0,0 +1,98 @@
+"""
+File: export.py
+Author: AleNriG
+Email: agorokhov94@gmail.com
+Github: https://github.com/alenrig
+Description: Export of profiles from statistics.Session.measure() and
+mean() straight from their arrays. Several formats are written in one pass:
+    'csv' - comma separated columns with names header;
+    'origin' - tab separated columns with long names and units header lines,
+    imported by Origin without settings;
+    'binary' - NumPy .npz archive of columns.
+Text rows are formatted by blocks, so no full size table is built.
+"""
+import csv
+
+import numpy as np
+
+FORMATS = ("csv", "origin", "binary")
+EXTENSIONS = dict(csv=".txt", origin=".dat", binary=".npz")
+BLOCK_SIZE = 10000
+
+
+def profile_columns(dict_of_data):
+    """Array columns of profile: everything of depth length, scalars
+    (doses, Rp, etc), names and cumulative doses are skipped.
+
+    :returns: dict('column': array, etc)
+
+    """
+    length = len(dict_of_data["depth"])
+    return {
+        name: value
+        for name, value in dict_of_data.items()
+        if isinstance(value, np.ndarray)
+        and value.shape == (length,)
+        and not name.endswith(" cumulative dose")
+    }
+
+
+def _units(name, ion_names):
+    if name == "depth":
+        return "nm"
+    if name == "time":
+        return "s"
+    if name in ion_names:
+        return "cm^-3"
+    return "counts/s"
+
+
+def write(dict_of_data, output_prefix, formats=("csv",), ion_names=(), extensions=None):
+    """Write profile into files output_prefix + extension of every format.
+
+    :dict_of_data: dict from measure() or from mean()
+    :output_prefix: file name without extension.
+    :formats: formats from FORMATS.
+    :ion_names: names of concentration columns (for units).
+    :extensions: dict(format: extension) to replace EXTENSIONS.
+    :returns: list of written files.
+
+    """
+    unknown = set(formats) - set(FORMATS)
+    if unknown:
+        raise ValueError("unknown export formats: " + ", ".join(sorted(unknown)))
+    extensions = dict(EXTENSIONS, **(extensions or {}))
+    columns = profile_columns(dict_of_data)
+    names = list(columns)
+    paths = [output_prefix + extensions[output_format] for output_format in formats]
+
+    if "binary" in formats:
+        # np.savez appends .npz to names with other extensions, a file is not
+        # renamed
+        with open(output_prefix + extensions["binary"], "wb") as file:
+            np.savez(file, **columns)
+
+    text_files = []
+    try:
+        if "csv" in formats:
+            file = open(output_prefix + extensions["csv"], "w", newline="")
+            text_files.append((file, ","))
+            csv.writer(file).writerow(names)
+        if "origin" in formats:
+            file = open(output_prefix + extensions["origin"], "w")
+            text_files.append((file, "\t"))
+            file.write("\t".join(names) + "\n")
+            file.write("\t".join(_units(name, ion_names) for name in names) + "\n")
+        if text_files:
+            length = len(dict_of_data["depth"])
+            values = list(columns.values())
+            for start in range(0, length, BLOCK_SIZE):
+                block = np.column_stack(
+                    [value[start : start + BLOCK_SIZE] for value in values]
+                )
+                for file, delimiter in text_files:
+                    np.savetxt(file, block, delimiter=delimiter, fmt="%.12g")
+    finally:
+        for file, _ in text_files:
+            file.close()
+    return paths
@@ -0,0 +1,365 @@
+"""Benchmark of the delta-layer fitting engines.
+
+Synthetic delta layers with known depth and width are convolved with the
+impulse function, noised and fitted by every available engine. For each
+engine the wall time, the number of forward model evaluations (trial
+convolutions actually made) and the error
+of the recovered depth and width are reported. The measured profile from
+tests/test_data is fitted as a fixed regression case and checked against its
+known optimum, the benchmark exits with status 1 if an engine misses it.
+Bootstrap confidence intervals are checked by their coverage of the true
+depth and width over noise realisations of the regression optimum sampled on
+the measured grid, the benchmark exits with status 1 if it is too low.
+
+Run from the repository root:
+    python -m gauss_fitting.benchmark gauss_fitting/tests/test_delta_params \
+        gauss_fitting/tests/test_data [CASES_NUMBER]
+"""
+import contextlib
+import io
+import sys
+import time
+
+import numpy
+from scipy.special import erfinv
+
+from gauss_fitting import delta_layer
+from gauss_fitting.delta_layer import (
+    BOOTSTRAP_LEVEL,
+    DEPTHSTEP,
+    MAX_POINTS_XGRID,
+    MAXDEPTH,
+    MAXWIDTH,
+    MINDEPTH,
+    MINWIDTH,
+    WIDTHSTEP,
+    ImpulseFunctionCreator,
+    adaptive_grid,
+    bootstrap_fitting,
+    center_grid,
+    integrate,
+    multiresolution_fitting,
+    read_data,
+    read_impulse_params,
+    trial_responses,
+)
+
+
+# synthetic cases
+CASES_NUMBER = 5
+NOISE_LEVEL = 0.02
+SYNTHETIC_STEP = 1.13
+SYNTHETIC_HALFSPAN = 80
+SEED = 0
+
+# optimum of tests/test_data with tests/test_delta_params, an engine passes if
+# it is within one step of its depth and width ranges
+REGRESSION_DEPTH = 1.5
+REGRESSION_WIDTH = 26
+
+# bootstrap coverage, intervals at BOOTSTRAP_LEVEL must hold the true values
+# at least in MIN_COVERAGE of cases
+COVERAGE_CASES = 40
+COVERAGE_REPLICATES = 200
+MIN_COVERAGE = 0.8
+
+
+def print_usage():
+    print("usage: " + sys.argv[0] + " PARAMS_FILE REGRESSION_FILE [CASES_NUMBER]")
+
+
+class Engine(object):
+    """Grid and search ranges of one fitting implementation.
+
+    kernel(grid, params) returns the impulse function on the fit grid,
+    points is None for the grid of adaptive_grid(), multiresolution engine
+    searches by multiresolution_fitting() instead of full_search_fitting().
+    """
+
+    def __init__(self, name, points, depths, widths, kernel, multiresolution=False):
+        self.name = name
+        self.points = points
+        self.depths = depths
+        self.widths = widths
+        self.kernel = kernel
+        self.multiresolution = multiresolution
+
+    def fit(self, grid, data, params):
+        """Fit the profile, return
+        (depth, width, input, response, residual, evaluations).
+        Depth is counted from the maximum of the data, as in the scripts.
+        """
+        centered_grid, _ = center_grid(grid, data)
+        if self.points is None:
+            fit_grid = adaptive_grid(centered_grid, params)
+        else:
+            fit_grid = numpy.linspace(min(centered_grid), max(centered_grid), num=self.points)
+        data_interpolated = numpy.interp(fit_grid, centered_grid, data)
+        impulse_function = self.kernel(fit_grid, params)
+        # full_search_fitting prints every trial, keep it out of the timings
+        with contextlib.redirect_stdout(io.StringIO()), _counted() as evaluations:
+            if self.multiresolution:
+                depth, width, fit_input, response = multiresolution_fitting(
+                    data_interpolated, impulse_function, fit_grid, self.depths,
+                    self.widths, params
+                )
+            else:
+                depth, width, fit_input, response = delta_layer.full_search_fitting(
+                    data_interpolated, impulse_function, fit_grid, self.depths,
+                    self.widths
+                )
+        residual = numpy.sqrt(numpy.mean((data_interpolated - response) ** 2))
+        return depth, width, fit_input, response, residual, evaluations[0]
+
+
+@contextlib.contextmanager
+def _counted():
+    """Count trial convolutions of full_search_fitting, the calls made inside
+    multiresolution_fitting too.
+
+    :returns: list with the number of convolutions, it grows while counting.
+    """
+    evaluations = [0]
+    search = delta_layer.full_search_fitting
+
+    def counted_search(response, impulse_function, grid, depths, widths):
+        evaluations[0] += len(depths) * len(widths)
+        return search(response, impulse_function, grid, depths, widths)
+
+    delta_layer.full_search_fitting = counted_search
+    try:
+        yield evaluations
+    finally:
+        delta_layer.full_search_fitting = search
+
+
+def _impulse_kernel(grid, params):
+    return ImpulseFunctionCreator(params).create(grid)
+
+
+def _truncated_kernel(grid, params):
+    return ImpulseFunctionCreator(params).create_truncated(grid)
+
+
+def available_engines():
+    """Engines with the settings of the fitting scripts.
+    delta_layer.py and delta_layer_restore/delta_layer.py search in their
+    script bodies, so their grids, kernels and ranges are reproduced with the
+    same impulse function formulas.
+    """
+    return [
+        Engine(
+            "gauss_fitting",
+            MAX_POINTS_XGRID,
+            numpy.arange(start=MINDEPTH, stop=MAXDEPTH, step=DEPTHSTEP),
+            numpy.arange(start=MINWIDTH, stop=MAXWIDTH, step=WIDTHSTEP),
+            _impulse_kernel,
+        ),
+        Engine(
+            "gauss_fitting adaptive",
+            None,
+            numpy.arange(start=MINDEPTH, stop=MAXDEPTH, step=DEPTHSTEP),
+            numpy.arange(start=MINWIDTH, stop=MAXWIDTH, step=WIDTHSTEP),
+            _impulse_kernel,
+        ),
+        Engine(
+            "gauss_fitting multires",
+            None,
+            numpy.arange(start=MINDEPTH, stop=MAXDEPTH, step=DEPTHSTEP),
+            numpy.arange(start=MINWIDTH, stop=MAXWIDTH, step=WIDTHSTEP),
+            _truncated_kernel,
+            multiresolution=True,
+        ),
+        Engine(
+            "delta_layer",
+            5000,
+            numpy.linspace(-50, +50, num=50),
+            numpy.linspace(5, 100, num=20),
+            _impulse_kernel,
+        ),
+        Engine(
+            "delta_layer_restore",
+            None,
+            numpy.linspace(-50, +50, num=50),
+            numpy.linspace(5, 100, num=20),
+            _truncated_kernel,
+        ),
+    ]
+
+
+def synthetic_case(params, depth, width, random_state):
+    """Measured-like profile of a gaussian layer at depth with width.
+
+    :returns: grid, data
+    """
+    grid = numpy.arange(-SYNTHETIC_HALFSPAN, SYNTHETIC_HALFSPAN, SYNTHETIC_STEP)
+    dose = 1e5
+    true_input = dose / width / numpy.sqrt(numpy.pi) * numpy.exp(-((grid - depth) / width) ** 2)
+    impulse_function = ImpulseFunctionCreator(params).create(grid)
+    data = numpy.convolve(impulse_function, true_input, "same") * SYNTHETIC_STEP
+    data += random_state.normal(scale=NOISE_LEVEL * data.max(), size=len(data))
+    return grid, data
+
+
+def run_synthetic(engines, params, cases_number):
+    """Fit random cases by every engine.
+
+    :returns: dict(engine name:
+                   list of (time, evaluations, depth error, width error))
+    """
+    random_state = numpy.random.RandomState(SEED)
+    results = {engine.name: [] for engine in engines}
+    for _ in range(cases_number):
+        depth = random_state.uniform(-10, 10)
+        width = random_state.uniform(5, 40)
+        grid, data = synthetic_case(params, depth, width, random_state)
+        # engines count depth from the data maximum
+        _, mid_x = center_grid(grid, data)
+        for engine in engines:
+            start = time.perf_counter()
+            fit_depth, fit_width, *_, evaluations = engine.fit(grid, data, params)
+            elapsed = time.perf_counter() - start
+            results[engine.name].append(
+                (elapsed, evaluations, fit_depth - (depth - mid_x), fit_width - width)
+            )
+    return results
+
+
+def run_regression(engines, params, grid, data):
+    """Fit the fixed regression profile by every engine.
+
+    :returns: dict(engine name: (time, depth, width, residual))
+    """
+    results = {}
+    for engine in engines:
+        start = time.perf_counter()
+        depth, width, _, _, residual, _ = engine.fit(grid, data, params)
+        results[engine.name] = (time.perf_counter() - start, depth, width, residual)
+    return results
+
+
+def check_regression(engines, regression):
+    """Engines whose regression fit is farther than one trial step from the
+    known optimum.
+
+    :returns: list of engine names
+    """
+    failed = []
+    for engine in engines:
+        _, depth, width, _ = regression[engine.name]
+        depth_step = numpy.diff(engine.depths).mean()
+        width_step = numpy.diff(engine.widths).mean()
+        if (abs(depth - REGRESSION_DEPTH) > depth_step
+                or abs(width - REGRESSION_WIDTH) > width_step):
+            failed.append(engine.name)
+    return failed
+
+
+def run_coverage(params, grid, data, cases_number=COVERAGE_CASES):
+    """Bootstrap intervals of noised profiles of the regression optimum on
+    the measured grid (centered as the data, dose of the data).
+
+    :returns: dict(name: (coverage, mean interval width, spread of estimates))
+    for depth and width, spread is the interval width of normal estimates
+    with their std.
+    """
+    centered_grid, _ = center_grid(grid, data)
+    fit_grid = adaptive_grid(centered_grid, params)
+    kernel = ImpulseFunctionCreator(params).create_truncated(fit_grid)
+    depths = numpy.arange(start=MINDEPTH, stop=MAXDEPTH, step=DEPTHSTEP)
+    widths = numpy.arange(start=MINWIDTH, stop=MAXWIDTH, step=WIDTHSTEP)
+    _, (response,) = trial_responses(
+        kernel, fit_grid, [REGRESSION_DEPTH], [REGRESSION_WIDTH]
+    )
+    clean = integrate(data, grid) * numpy.interp(centered_grid, fit_grid, response)
+
+    random_state = numpy.random.RandomState(SEED)
+    truths = dict(depth=REGRESSION_DEPTH, width=REGRESSION_WIDTH)
+    intervals = {name: [] for name in truths}
+    for case in range(cases_number):
+        noise = random_state.normal(scale=NOISE_LEVEL * clean.max(), size=len(clean))
+        noisy = clean + noise
+        case_intervals = bootstrap_fitting(
+            noisy, centered_grid, kernel, fit_grid, depths, widths,
+            replicates=COVERAGE_REPLICATES, seed=case
+        )
+        for name in truths:
+            intervals[name].append(case_intervals[name])
+
+    z = numpy.sqrt(2) * erfinv(BOOTSTRAP_LEVEL)
+    results = {}
+    for name, truth in truths.items():
+        estimates, lows, highs = numpy.array(intervals[name]).T
+        results[name] = (
+            numpy.mean((lows <= truth) & (truth <= highs)),
+            numpy.mean(highs - lows),
+            2 * z * numpy.std(estimates),
+        )
+    return results
+
+
+def print_report(engines, synthetic, regression, coverage):
+    """Speedup is the measured one against the first engine, evaluations are
+    the mean over synthetic cases."""
+    reference_time = numpy.mean([case[0] for case in synthetic[engines[0].name]])
+    print("{:<24}{:>8}{:>10}{:>10}{:>12}{:>12}".format(
+        "engine", "evals", "time, s", "speedup", "|ddepth|", "|dwidth|"))
+    for engine in engines:
+        times, evaluations, depth_errors, width_errors = zip(*synthetic[engine.name])
+        print("{:<24}{:>8.0f}{:>10.3f}{:>10.1f}{:>12.3f}{:>12.3f}".format(
+            engine.name,
+            numpy.mean(evaluations),
+            numpy.mean(times),
+            reference_time / numpy.mean(times),
+            numpy.mean(numpy.abs(depth_errors)),
+            numpy.mean(numpy.abs(width_errors)),
+        ))
+    print()
+    print("regression case:")
+    print("{:<24}{:>10}{:>10}{:>10}{:>14}".format(
+        "engine", "time, s", "depth", "width", "rms residual"))
+    for engine in engines:
+        elapsed, depth, width, residual = regression[engine.name]
+        print("{:<24}{:>10.3f}{:>10.2f}{:>10.2f}{:>14.4e}".format(
+            engine.name, elapsed, depth, width, residual))
+    print()
+    print("bootstrap coverage at {:g}%:".format(BOOTSTRAP_LEVEL * 100))
+    print("{:<24}{:>10}{:>16}{:>16}".format(
+        "parameter", "coverage", "interval width", "spread"))
+    for name, (covered, width, spread) in coverage.items():
+        print("{:<24}{:>10.3f}{:>16.3f}{:>16.3f}".format(name, covered, width, spread))
+
+
+def main():
+    if len(sys.argv) not in (3, 4):
+        print("wrong number of arguments")
+        print_usage()
+        exit(1)
+
+    params = read_impulse_params(sys.argv[1])
+    grid, data = read_data(sys.argv[2])
+    cases_number = int(sys.argv[3]) if len(sys.argv) == 4 else CASES_NUMBER
+
+    engines = available_engines()
+    synthetic = run_synthetic(engines, params, cases_number)
+    regression = run_regression(engines, params, grid, data)
+    coverage = run_coverage(params, grid, data)
+    print_report(engines, synthetic, regression, coverage)
+
+    failed = check_regression(engines, regression)
+    if failed:
+        print()
+        print("regression failed: expected depth {}, width {} for {}".format(
+            REGRESSION_DEPTH, REGRESSION_WIDTH, ", ".join(failed)))
+    undercovered = [name for name, (covered, _, _) in coverage.items()
+                    if covered < MIN_COVERAGE]
+    if undercovered:
+        print()
+        print("bootstrap coverage below {:g} for {}".format(
+            MIN_COVERAGE, ", ".join(undercovered)))
+    if failed or undercovered:
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
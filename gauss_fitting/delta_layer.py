@@ -1,33 +1,43 @@
 import sys
+import time
+from multiprocessing.pool import ThreadPool
 import numpy
-import scipy
 from scipy.special import erf
 
+import profiling
+
 
 # constants
 MAX_POINTS_XGRID = 1000
+GRID_POINTS_PER_SCALE = 4
+MULTIRESOLUTION_FACTOR = 4  # with --multiresolution option only
 MINDEPTH, MAXDEPTH, DEPTHSTEP =-20, 20, 0.5
 MINWIDTH, MAXWIDTH, WIDTHSTEP = 1, 100, 1
+KERNEL_TOLERANCE = 1e-12
+BOOTSTRAP_LEVEL = 0.95
+BOOTSTRAP_BATCH = 256
 
 
 def print_usage():
-    print("usage: " + sys.argv[0] + " PARAMS_FILE INPUT_FILE OUTPUT_FILE")
+    print("usage: " + sys.argv[0] + " [--multiresolution] PARAMS_FILE INPUT_FILE OUTPUT_FILE [REPLICATES [WORKERS]]")
 
 
 def read_data(file_path):
     grid, data = [], []
-    with open(file_path, 'r') as file:
+    with profiling.stage('read_data') as stage, open(file_path, 'r') as file:
         for line in file.read().splitlines():
             x, y = map(float, line.split())
             grid.append(x)
             data.append(y)
+        stage.add(bytes_read=file.tell(), items=len(grid))
     return numpy.array(grid), numpy.array(data)
 
 
 def write_data(file_path, xs, ys):
-    with open(file_path, 'w') as file:
+    with profiling.stage('write_data') as stage, open(file_path, 'w') as file:
         for x, y in zip(xs, ys):
             file.write('{:e} {:e}\n'.format(x, y))
+        stage.add(bytes_written=file.tell(), items=len(xs))
 
 
 def center_grid(grid, data):
@@ -54,6 +64,7 @@ class ImpulseFunctionCreator(object):
         self.lambda_g = lambda_g
         self.lambda_d = lambda_d
 
+    @profiling.timed('impulse_function')
     def create(self, grid):
         ksi1_grid = (grid + self.a / 2 / self.p) * numpy.sqrt(self.p)
         ksi2_grid = (grid - self.b / 2 / self.p) * numpy.sqrt(self.p)
@@ -62,19 +73,95 @@ class ImpulseFunctionCreator(object):
         impulse_function /= 2 * (self.K / self.a + 1 / self.b)
         return impulse_function
 
+    def support(self, tolerance=KERNEL_TOLERANCE):
+        # interval out of which exponential tails of the kernel (unit integral) hold
+        # less than tolerance, gaussian part is kept within the same tolerance too
+        norm = self.K / self.a + 1 / self.b
+        gauss = self.sigma * numpy.sqrt(2 * numpy.log(2 / tolerance))
+        left = (self.a ** 2 / 4 / self.p + numpy.log(2 * self.K / self.a / norm / tolerance)) / self.a
+        right = (self.b ** 2 / 4 / self.p + numpy.log(2 / self.b / norm / tolerance)) / self.b
+        return -max(left, gauss), max(right, gauss)
+
+    @profiling.timed('impulse_function')
+    def create_truncated(self, grid, tolerance=KERNEL_TOLERANCE):
+        # kernel on uniform grid cut to the support, result of convolution is
+        # the same as with create(grid) up to the truncation error, which is the
+        # part of the discrete integral in the cut tails only
+        step = (grid[-1] - grid[0]) / (len(grid) - 1)
+        low, high = self.support(tolerance)
+        first = max(0, int(numpy.floor((low - grid[0]) / step)))
+        last = min(len(grid) - 1, int(numpy.ceil((high - grid[0]) / step)))
+        full = self.create(grid)
+        error = (full[:first].sum() + full[last + 1:].sum()) * step
+        return TruncatedKernel(full[first:last + 1], (len(grid) - 1) // 2 - first, error)
+
+
+def _same(full, offset, points):
+    # cut 'same' part of full convolution, zeros where it is out of full one
+    same = numpy.zeros(full.shape[:-1] + (points,))
+    low, high = max(0, -offset), min(points, full.shape[-1] - offset)
+    same[..., low:high] = full[..., low + offset:high + offset]
+    return same
+
+
+class TruncatedKernel(object):
+    # significant taps of impulse function; offset is the index of full convolution
+    # with taps where numpy.convolve(impulse_function, signal, 'same') starts;
+    # error is the part of kernel integral lost in the cut tails
+    def __init__(self, taps, offset, error):
+        self.taps = taps
+        self.offset = offset
+        self.error = error
+
+    def convolve(self, signal):
+        return _same(numpy.convolve(signal, self.taps), self.offset, len(signal))
+
+
+def adaptive_grid(centered_grid, params, points_per_scale=GRID_POINTS_PER_SCALE):
+    # uniform fit grid resolving the narrowest of sigma, lambda_g, lambda_d by
+    # points_per_scale points, but not coarser than the data
+    lambda_g, lambda_d, sigma, K = params
+    minx, maxx = min(centered_grid), max(centered_grid)
+    data_step = (maxx - minx) / (len(centered_grid) - 1)
+    step = min(min(sigma, lambda_g, lambda_d) / points_per_scale, data_step)
+    points = int(numpy.ceil((maxx - minx) / step)) + 1
+    return numpy.linspace(minx, maxx, num=points)
 
+
+@profiling.timed('multiresolution_fitting')
+def multiresolution_fitting(response, impulse_function, grid, depths, widths, params,
+                            factor=MULTIRESOLUTION_FACTOR):
+    # the same as full_search_fitting, but search is done on a grid and trial
+    # ranges coarser by factor first, then with full resolution only around the
+    # coarse optimum; impulse function is the truncated one on grid, params are
+    # needed for the kernel on the coarse grid
+    coarse_grid = numpy.linspace(grid[0], grid[-1], num=(len(grid) - 1) // factor + 1)
+    coarse_depth, coarse_width, _, _ = full_search_fitting(
+        numpy.interp(coarse_grid, grid, response),
+        ImpulseFunctionCreator(params).create_truncated(coarse_grid),
+        coarse_grid, depths[::factor], widths[::factor])
+
+    near_depths = depths[numpy.abs(depths - coarse_depth) <= factor * numpy.diff(depths).mean()]
+    near_widths = widths[numpy.abs(widths - coarse_width) <= factor * numpy.diff(widths).mean()]
+    return full_search_fitting(response, impulse_function, grid, near_depths, near_widths)
+
+
+@profiling.timed('full_search_fitting')
 def full_search_fitting(response, impulse_function, grid, depths, widths):
     min_difference = 1e500
     optimal_depth, optimal_width = 0, 0
     optimal_input = numpy.zeros(len(grid))
     optimal_response = numpy.zeros(len(grid))
-    integral_signal = numpy.trapz(y=response, x=grid)
+    integral_signal = integrate(response, grid)
     delta_grid = numpy.diff(grid).mean()
     for depth, width in [(d, w) for d in depths for w in widths]:
         print(depth, width)
         height = integral_signal / width / numpy.sqrt(numpy.pi)
         test_input = height * numpy.exp(-((grid - depth) / width) ** 2)
-        test_response = numpy.convolve(impulse_function, test_input, 'same') * delta_grid
+        if isinstance(impulse_function, TruncatedKernel):
+            test_response = impulse_function.convolve(test_input) * delta_grid
+        else:
+            test_response = numpy.convolve(impulse_function, test_input, 'same') * delta_grid
         difference = sum((response - test_response) ** 2)
         if difference < min_difference:
             min_difference = difference
@@ -85,35 +172,182 @@ def full_search_fitting(response, impulse_function, grid, depths, widths):
     return optimal_depth, optimal_width, optimal_input, optimal_response
 
 
+def integrate(ys, grid):
+    # trapezoid rule along the last axis
+    return ((ys[..., 1:] + ys[..., :-1]) / 2 * numpy.diff(grid)).sum(axis=-1)
+
+
+@profiling.timed('trial_responses')
+def trial_responses(impulse_function, grid, depths, widths):
+    # responses of all trial inputs of unit dose, convolved at once through FFT
+    # the same way as numpy.convolve(impulse_function, test_input, 'same')
+    points = len(grid)
+    if not isinstance(impulse_function, TruncatedKernel):
+        impulse_function = TruncatedKernel(impulse_function, (points - 1) // 2, 0.0)
+    taps = impulse_function.taps
+    trials = numpy.array([(d, w) for d in depths for w in widths])
+    inputs = numpy.exp(-((grid - trials[:, :1]) / trials[:, 1:]) ** 2) / trials[:, 1:] / numpy.sqrt(numpy.pi)
+    size = 1 << (points + len(taps) - 2).bit_length()
+    spectrum = numpy.fft.rfft(taps, size) * numpy.fft.rfft(inputs, size, axis=1)
+    full = numpy.fft.irfft(spectrum, size, axis=1)[:, :points + len(taps) - 1]
+    return trials, _same(full, impulse_function.offset, points) * numpy.diff(grid).mean()
+
+
+def _best_trials(samples, doses, responses):
+    # index of least squares trial for every sample: |y - I * r|^2 without |y|^2
+    products = samples @ responses.T
+    norms = (responses ** 2).sum(axis=1)
+    return numpy.argmin(doses[:, None] ** 2 * norms - 2 * doses[:, None] * products, axis=1)
+
+
+def _vertex(left, center, right):
+    # offset of parabola vertex through three equidistant values, in steps
+    curvature = left - 2 * center + right
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        offset = numpy.where(curvature > 0, (left - right) / 2 / curvature, 0.0)
+    return numpy.clip(offset, -0.5, 0.5)
+
+
+def _refined_trials(samples, doses, responses, depths, widths):
+    # least squares depth and width of every sample below the trial steps: best
+    # trial is moved to the vertex of parabola through its sum of squares and
+    # the ones of its neighbours along depth and along width
+    products = samples @ responses.T
+    norms = (responses ** 2).sum(axis=1)
+    costs = doses[:, None] ** 2 * norms - 2 * doses[:, None] * products
+    costs = costs.reshape(len(samples), len(depths), len(widths))
+    rows = numpy.arange(len(samples))
+    best_depths, best_widths = numpy.unravel_index(
+        costs.reshape(len(samples), -1).argmin(axis=1), costs.shape[1:])
+    result = []
+    for best, values, axis in ((best_depths, depths, 1), (best_widths, widths, 2)):
+        estimates = values[best].astype(float)
+        inner = (best > 0) & (best < len(values) - 1)
+        if inner.any():
+            index = [rows[inner], best_depths[inner], best_widths[inner]]
+            center = costs[tuple(index)]
+            index[axis] = best[inner] - 1
+            left = costs[tuple(index)]
+            index[axis] = best[inner] + 1
+            right = costs[tuple(index)]
+            estimates[inner] += _vertex(left, center, right) * numpy.diff(values).mean()
+        result.append(estimates)
+    return result
+
+
+def _interpolation_matrix(data_grid, grid):
+    # linear interpolation from data_grid onto grid as a matrix, values @ matrix
+    # is numpy.interp(grid, data_grid, values) for every row of values
+    return numpy.array([numpy.interp(grid, data_grid, unit) for unit in numpy.eye(len(data_grid))])
+
+
+@profiling.timed('bootstrap_fitting')
+def bootstrap_fitting(data, data_grid, impulse_function, grid, depths, widths, replicates=1000,
+                      method='residual', level=BOOTSTRAP_LEVEL, workers=None, seed=None):
+    # confidence intervals of depth, width and dose by resampling of residuals of the
+    # best fit, method 'residual' draws residuals with replacement, 'wild' flips their
+    # signs randomly (keeps noise level of every point); residuals are taken at the
+    # measured points data_grid, the only independent ones, and every replicate is
+    # interpolated onto the fit grid like the data; all replicates are fitted
+    # against the same precomputed trial responses by matrix products in batches and
+    # refined below the trial steps, so intervals are not bound to the trial grid
+    if method not in ('residual', 'wild'):
+        raise ValueError('unknown bootstrap method: ' + method)
+    _, responses = trial_responses(impulse_function, grid, depths, widths)
+    interpolation = _interpolation_matrix(data_grid, grid)
+    response = data @ interpolation
+    dose = integrate(response, grid)
+    (depth,), (width,) = _refined_trials(
+        response[None, :], numpy.array([dose]), responses, depths, widths)
+    # replicates are drawn around the refined fit, not around the nearest trial
+    fitted = dose * trial_responses(impulse_function, grid, [depth], [width])[1][0]
+    residuals = data - numpy.interp(data_grid, grid, fitted)
+
+    random_state = numpy.random.RandomState(seed)
+    if method == 'residual':
+        noise = residuals[random_state.randint(len(residuals), size=(replicates, len(residuals)))]
+    else:
+        noise = residuals * random_state.choice((-1.0, 1.0), size=(replicates, len(residuals)))
+    samples = fitted + noise @ interpolation
+    doses = integrate(samples, grid)
+
+    def fit_batch(start):
+        stop = start + BOOTSTRAP_BATCH
+        return _refined_trials(samples[start:stop], doses[start:stop], responses, depths, widths)
+
+    with ThreadPool(workers) as pool:
+        fits = pool.map(fit_batch, range(0, replicates, BOOTSTRAP_BATCH))
+    fit_depths = numpy.concatenate([fit_depth for fit_depth, _ in fits])
+    fit_widths = numpy.concatenate([fit_width for _, fit_width in fits])
+
+    tails = [(1 - level) / 2 * 100, (1 + level) / 2 * 100]
+    result = {}
+    for name, estimate, values in (('depth', depth, fit_depths),
+                                   ('width', width, fit_widths),
+                                   ('dose', dose, doses)):
+        # basic bootstrap interval and estimate, they cancel the bias of
+        # parabolic refinement
+        quantiles = numpy.percentile(values, [tails[0], 50, tails[1]])
+        high, corrected, low = 2 * estimate - quantiles
+        result[name] = corrected, low, high
+    return result
+
+
+def print_confidence_intervals(intervals, level=BOOTSTRAP_LEVEL):
+    for name, (estimate, low, high) in intervals.items():
+        print('{}: {:g} ({:g} .. {:g} at {:g}%)'.format(name, estimate, low, high, level * 100))
+
+
 def main():
-    # check the command line arguments
-    if len(sys.argv) != 4:
+    # check the command line arguments, full search unless coarse to fine one is asked
+    multiresolution = '--multiresolution' in sys.argv[1:]
+    args = [arg for arg in sys.argv[1:] if arg != '--multiresolution']
+    if len(args) not in (3, 4, 5):
         print("wrong number of arguments")
         print_usage()
         exit(1)
 
     # read the impulse function params
-    params_path = sys.argv[1]
+    params_path = args[0]
     params = read_impulse_params(params_path)
     impulse_function_creator = ImpulseFunctionCreator(params)
 
     # read the input file
-    inputfile_path = sys.argv[2]
+    inputfile_path = args[1]
     grid, data = read_data(inputfile_path)
     centered_grid, mid_x = center_grid(grid, data)
 
-    # automatic fitting
-    fit_grid = scipy.linspace(min(centered_grid), max(centered_grid), num=MAX_POINTS_XGRID)
-    data_interpolated = numpy.interp(fit_grid, centered_grid, data)
-    impulse_function = impulse_function_creator.create(fit_grid)
+    # automatic fitting on adaptive grid
     depths_range = numpy.arange(start=MINDEPTH, stop=MAXDEPTH, step=DEPTHSTEP)
     widths_range = numpy.arange(start=MINWIDTH, stop=MAXWIDTH, step=WIDTHSTEP)
-    optimal_fit = full_search_fitting(data_interpolated, impulse_function, fit_grid, depths_range, widths_range)
+    fit_grid = adaptive_grid(centered_grid, params)
+    data_interpolated = numpy.interp(fit_grid, centered_grid, data)
+    impulse_function = impulse_function_creator.create_truncated(fit_grid)
+    print('fit grid: {} points instead of {}'.format(len(fit_grid), MAX_POINTS_XGRID))
+    print('kernel taps: {} of {}, truncation error: {:.2e}'.format(
+        len(impulse_function.taps), len(fit_grid), impulse_function.error))
+    start = time.perf_counter()
+    if multiresolution:
+        optimal_fit = multiresolution_fitting(
+            data_interpolated, impulse_function, fit_grid, depths_range, widths_range, params)
+    else:
+        optimal_fit = full_search_fitting(data_interpolated, impulse_function, fit_grid, depths_range, widths_range)
+    search_time = time.perf_counter() - start
     optimal_depth, optimal_width, optimal_input, optimal_response = optimal_fit
     print('optimal params are:', optimal_depth, optimal_width)
+    print('{} search time: {:.3f} s'.format(
+        'multiresolution' if multiresolution else 'full', search_time))
+
+    # bootstrap confidence intervals
+    if len(args) > 3:
+        replicates = int(args[3])
+        workers = int(args[4]) if len(args) > 4 else None
+        intervals = bootstrap_fitting(data, centered_grid, impulse_function, fit_grid, depths_range,
+                                      widths_range, replicates=replicates, workers=workers)
+        print_confidence_intervals(intervals)
 
     # save files
-    output_prefix = sys.argv[3]
+    output_prefix = args[2]
     write_data(output_prefix + '_input', fit_grid + mid_x, optimal_input)
     write_data(output_prefix + '_response', fit_grid + mid_x, optimal_response)
 
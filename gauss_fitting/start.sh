@@ -1,12 +1,13 @@
 #!/bin/bash
 
 python_interpreter=python3
-program=delta_layer.py
+# run as a module from the repository root, it imports profiling from there
+program=gauss_fitting.delta_layer
 
 delta_params=tests/test_delta_params
 raw_data=tests/test_data
 processed_data_prefix=tests/test_output
 
-${python_interpreter} ${program} ${delta_params} ${raw_data} ${processed_data_prefix}
+cd "$(dirname "$0")/.." && ${python_interpreter} -m ${program} gauss_fitting/${delta_params} gauss_fitting/${raw_data} gauss_fitting/${processed_data_prefix}
 
-gnuplot -e "original='${raw_data}'; outputprefix='${processed_data_prefix}'" plot_script.gpi
+cd gauss_fitting && gnuplot -e "original='${raw_data}'; outputprefix='${processed_data_prefix}'" plot_script.gpi
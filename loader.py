@@ -0,0 +1,107 @@
+"""
+File: loader.py
+Author: AleNriG
+Email: agorokhov94@gmail.com
+Github: https://github.com/alenrig
+Description: Pipelined loading of many datafiles. Threads prefetch raw bytes
+from disk (or network share), processes parse them and optionally compute
+something on parsed data, so reading, parsing, computing and the caller work
+overlap. One process pool can be shared by many load() calls.
+Results are yielded in human sorted order, queues are bounded by prefetch
+number, so memory does not depend on the number of files.
+
+Usage:
+    with concurrent.futures.ProcessPoolExecutor() as pool:
+        for data in loader.load(datafiles, compute=function, pool=pool):
+            ...
+"""
+import contextlib
+import io
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+READERS = 4
+PREFETCH = 8
+
+
+def read_bytes(input_file):
+    with open(input_file, "rb") as file:
+        return file.read()
+
+
+def parse_csv(input_file, raw):
+    """Parse raw bytes of file.csv from converter.py.
+
+    :returns: dict('filename': filename, 'time': [...], 'ion 1': [...], etc)
+    like statistics._read_file()
+
+    """
+    text = raw.decode()
+    legend = text.split("\n", 1)[0].strip().split(",")
+    points = np.loadtxt(io.StringIO(text), delimiter=",", skiprows=1, ndmin=2)
+    data = dict(filename=input_file.rsplit("_", 1)[0])
+    for number, label in enumerate(legend):
+        data[label] = points[:, number]
+    return data
+
+
+def _parse_and_compute(parse, compute, input_file, raw):
+    data = parse(input_file, raw)
+    return data if compute is None else compute(data)
+
+
+def load(
+    datafiles,
+    parse=parse_csv,
+    compute=None,
+    readers=READERS,
+    workers=None,
+    prefetch=PREFETCH,
+    pool=None,
+):
+    """Read, parse and compute datafiles concurrently.
+
+    :datafiles: list of files.
+    :parse: function(input_file, raw bytes) run in worker processes.
+    :compute: function(parsed data) run in worker processes after parse.
+    parse and compute must be picklable (module level functions or
+    functools.partial of them).
+    :readers: number of reading threads.
+    :workers: number of processes, ProcessPoolExecutor default if None.
+    :prefetch: maximum number of files read and parsed ahead.
+    :pool: process pool to reuse, it is left running; a new one of workers
+    processes is started and shut down if None.
+    :yields: results in human sorted order of datafiles.
+
+    """
+    # statistics imports this module, so its helpers are imported on call
+    from statistics import _human_sort
+
+    files = iter(sorted(datafiles, key=_human_sort))
+    reads, parses = deque(), deque()
+    if pool is None:
+        pool = ProcessPoolExecutor(workers)
+    else:
+        pool = contextlib.nullcontext(pool)
+    with ThreadPoolExecutor(readers) as io_pool, pool as cpu_pool:
+
+        def prefetch_next():
+            datafile = next(files, None)
+            if datafile is not None:
+                reads.append((datafile, io_pool.submit(read_bytes, datafile)))
+
+        for _ in range(prefetch):
+            prefetch_next()
+        while reads or parses:
+            if reads and len(parses) < prefetch:
+                datafile, raw = reads.popleft()
+                parses.append(
+                    cpu_pool.submit(
+                        _parse_and_compute, parse, compute, datafile, raw.result()
+                    )
+                )
+                prefetch_next()
+            else:
+                yield parses.popleft().result()
@@ -0,0 +1,136 @@
+"""
+File: pearson.py
+Author: AleNriG
+Email: agorokhov94@gmail.com
+Github: https://github.com/alenrig
+Description: Moments of implant profiles and Pearson IV distribution with the
+same first four moments. Profiles are stacked into 2d arrays (rows padded
+with nan), so moments of all ions of hundreds of files are calculated by a
+few array operations. Pearson IV parameters are closed form from Rp, ΔRp,
+skewness γ and kurtosis β, there is no iterative fitting.
+
+Usage:
+    rp, delta_rp, gamma, beta = pearson.moments(depths, concentrations)
+    profiles = pearson.profile(depths, rp, delta_rp, gamma, beta, doses)
+"""
+import numpy as np
+
+NORMALIZATION_POINTS = 4001
+NORMALIZATION_WIDTH = 20  # in ΔRp to every side of Rp
+
+
+def moments(xs, ys):
+    """Rp, ΔRp, skewness and kurtosis of every row, moments are concentration
+    weighted means over points, nan points (bad or padding) are skipped:
+        Rp = Σ x * C / Σ C, ΔRp ** 2 = Σ (x - Rp) ** 2 * C / Σ C, etc.
+
+    :xs: 2d array of depths, or 1d for all rows.
+    :ys: 2d array of concentrations, rows padded with nan.
+    :returns: arrays rp, delta_rp, gamma, beta
+
+    """
+    ys = np.atleast_2d(ys)
+    xs = np.broadcast_to(xs, ys.shape)
+    weights = np.nansum(ys, axis=1)
+    rp = np.nansum(xs * ys, axis=1) / weights
+    shifted = xs - rp[:, None]
+    shifted_2 = shifted ** 2
+    m2 = np.nansum(shifted_2 * ys, axis=1) / weights
+    m3 = np.nansum(shifted_2 * shifted * ys, axis=1) / weights
+    m4 = np.nansum(shifted_2 ** 2 * ys, axis=1) / weights
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return rp, np.sqrt(m2), m3 / m2 ** 1.5, m4 / m2 ** 2
+
+
+def parameters(delta_rp, gamma, beta):
+    """Coefficients of Pearson equation in the sign convention of Hobler
+        d ln(f) / ds = (s - b1) / (b0 + b1 * s + b2 * s ** 2),  s = x - Rp
+    (integrated by _log_density) and mask of moments in Pearson IV region (b2 < 0, no real roots).
+
+    :returns: b0, b1, b2, valid
+
+    """
+    delta_rp, gamma, beta = np.broadcast_arrays(
+        *(np.asarray(value, dtype=float) for value in (delta_rp, gamma, beta))
+    )
+    gamma_2 = gamma ** 2
+    a = 10 * beta - 12 * gamma_2 - 18
+    with np.errstate(invalid="ignore", divide="ignore"):
+        b0 = -(delta_rp ** 2) * (4 * beta - 3 * gamma_2) / a
+        b1 = -gamma * delta_rp * (beta + 3) / a
+        b2 = -(2 * beta - 3 * gamma_2 - 6) / a
+        valid = (a > 0) & (b2 < 0) & (4 * b0 * b2 - b1 ** 2 > 0)
+    return b0, b1, b2, valid
+
+
+def _log_density(s, b0, b1, b2):
+    """Not normalized ln(f) of Pearson IV, arguments broadcast."""
+    root = np.sqrt(4 * b0 * b2 - b1 ** 2)
+    return np.log(np.abs(b0 + b1 * s + b2 * s ** 2)) / (2 * b2) - (
+        b1 / b2 + 2 * b1
+    ) / root * np.arctan((2 * b2 * s + b1) / root)
+
+
+def profile(xs, rp, delta_rp, gamma, beta, doses):
+    """Pearson IV profiles with given moments on depth grids, integral of
+    every row is its dose. Rows out of Pearson IV region are nan.
+
+    :xs: 2d array of depths, or 1d for all rows.
+    :returns: 2d array of concentrations.
+
+    """
+    rp, delta_rp, doses = (
+        np.asarray(value, dtype=float) for value in (rp, delta_rp, doses)
+    )
+    b0, b1, b2, valid = parameters(delta_rp, gamma, beta)
+    b0, b1, b2 = (value[:, None] for value in (b0, b1, b2))
+
+    # normalization by integral over wide grid around Rp
+    grid = np.linspace(-NORMALIZATION_WIDTH, NORMALIZATION_WIDTH, NORMALIZATION_POINTS)
+    s = grid * delta_rp[:, None]
+    with np.errstate(invalid="ignore", divide="ignore", over="ignore"):
+        log_density = _log_density(s, b0, b1, b2)
+        peak = np.max(
+            log_density, axis=1, where=np.isfinite(log_density), initial=-np.inf
+        )
+        density = np.exp(log_density - peak[:, None])
+        step = s[:, 1] - s[:, 0]
+        area = step * (density.sum(axis=1) - (density[:, 0] + density[:, -1]) / 2)
+
+        s = np.broadcast_to(xs, (len(rp), np.shape(xs)[-1])) - rp[:, None]
+        result = np.exp(_log_density(s, b0, b1, b2) - peak[:, None])
+        result *= (doses / area)[:, None]
+    result[~valid] = np.nan
+    return result
+
+
+def fit(datas, ion_names):
+    """Pearson IV of all ions in all datas, moments are taken from
+    statistics.Session.measure() results.
+
+    :datas: list of dicts from statistics.Session.measure()
+    :returns: dict(filename: dict(ion_name: Pearson IV concentration on
+    data depth grid))
+
+    """
+    keys = [
+        (data, ion_name)
+        for data in datas
+        for ion_name in ion_names
+        if ion_name + " β" in data
+    ]
+    if not keys:
+        return {}
+    length = max(len(data["depth"]) for data, _ in keys)
+    xs = np.full((len(keys), length), np.nan)
+    for row, (data, _) in enumerate(keys):
+        xs[row, : len(data["depth"])] = data["depth"]
+    rp, delta_rp, gamma, beta, doses = (
+        np.array([data[ion_name + suffix] for data, ion_name in keys])
+        for suffix in (" Rp", " ΔRp", " γ", " β", " dose")
+    )
+    profiles = profile(xs, rp, delta_rp, gamma, beta, doses)
+    result = {}
+    for (data, ion_name), row in zip(keys, profiles):
+        result.setdefault(data["filename"], {})[ion_name] = row[: len(data["depth"])]
+    return result
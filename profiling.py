@@ -0,0 +1,157 @@
+"""
+File: profiling.py
+Author: AleNriG
+Email: agorokhov94@gmail.com
+Github: https://github.com/alenrig
+Description: Lightweight stage timing for converter.py, statistics.py and the
+fitting scripts. For every stage wall time, calls number, bytes read/written
+and array sizes are collected.
+
+Profiling is off by default, stages then cost one global check. Turn it on
+with environment variable SIMS_PROFILE=profile.json (or call enable()), and
+the JSON profile is written when the run ends.
+
+Usage:
+    with profiling.stage("parsing") as stage:
+        ...
+        stage.add(bytes_read=size, items=array.size)
+
+    @profiling.timed("fitting")
+    def fit(...):
+        ...
+"""
+import atexit
+import functools
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+_enabled = False
+_stats = {}
+_started = None
+
+
+class _Stage:
+    """Timed stage, results are merged into module statistics on exit."""
+
+    __slots__ = ("name", "start", "counters")
+
+    def __init__(self, name):
+        self.name = name
+        self.counters = {}
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        stats = _stats.setdefault(self.name, dict(calls=0, time=0.0))
+        stats["calls"] += 1
+        stats["time"] += elapsed
+        for key, value in self.counters.items():
+            stats[key] = stats.get(key, 0) + value
+        return False
+
+    def add(self, **counters):
+        """Add counters (bytes_read, bytes_written, items, etc) to the stage."""
+        for key, value in counters.items():
+            self.counters[key] = self.counters.get(key, 0) + int(value)
+
+
+class _NullStage:
+    """Stage used when profiling is off."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def add(self, **counters):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+def enabled():
+    return _enabled
+
+
+def enable(output_path=None):
+    """Start collecting statistics.
+
+    :output_path: file.json to dump the profile into at exit.
+
+    """
+    global _enabled, _started
+    _enabled = True
+    _started = datetime.now().isoformat(timespec="seconds")
+    if output_path is not None:
+        atexit.register(dump, output_path)
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def reset():
+    _stats.clear()
+
+
+def stage(name):
+    """Context manager timing the stage with given name."""
+    if not _enabled:
+        return _NULL_STAGE
+    return _Stage(name)
+
+
+def timed(name=None):
+    """Decorator timing every call of the function as a stage.
+
+    :name: stage name, function name by default.
+
+    """
+
+    def decorator(func):
+        label = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with _Stage(label):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def profile():
+    """Return collected statistics.
+
+    :returns: dict('started': ..., 'argv': [...], 'stages': {name: {...}})
+
+    """
+    return dict(
+        started=_started,
+        argv=sys.argv,
+        stages={name: dict(stats) for name, stats in _stats.items()},
+    )
+
+
+def dump(output_path):
+    """Write collected statistics to file.json."""
+    with open(output_path, "w") as file:
+        json.dump(profile(), file, indent=2, ensure_ascii=False)
+
+
+if os.environ.get("SIMS_PROFILE"):
+    enable(os.environ["SIMS_PROFILE"])
@@ -0,0 +1,240 @@
+"""
+File: results_db.py
+Author: AleNriG
+Email: agorokhov94@gmail.com
+Github: https://github.com/alenrig
+Description: Local SQLite database of results (no server needed). Stores
+measurement metadata and doses, Rp, ΔRp, peak concentrations from
+statistics.Session.measure(), means and dose std from mean(), and optionally
+zlib compressed profiles. Tables are indexed by sample, measurement number,
+ion and date (sample and number ones are case insensitive, as LIKE patterns,
+so prefix patterns use them); every ingest is one transaction with bulk
+inserts.
+
+Usage:
+    with results_db.ResultsDB("results.sqlite") as db:
+        db.ingest(datas, session.ion_names, means=[means], profiles=True)
+        db.doses("B", sample="2-%", since="2019-01-01")
+"""
+import sqlite3
+import zlib
+from datetime import datetime
+
+import numpy as np
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS measurements (
+    id INTEGER PRIMARY KEY,
+    filename TEXT NOT NULL UNIQUE,
+    sample TEXT NOT NULL COLLATE NOCASE,
+    number TEXT NOT NULL COLLATE NOCASE,
+    date TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS ion_results (
+    measurement_id INTEGER NOT NULL REFERENCES measurements(id) ON DELETE CASCADE,
+    ion TEXT NOT NULL,
+    dose REAL,
+    rp REAL,
+    delta_rp REAL,
+    peak REAL,
+    PRIMARY KEY (measurement_id, ion)
+);
+CREATE TABLE IF NOT EXISTS sample_means (
+    sample TEXT NOT NULL,
+    ion TEXT NOT NULL,
+    date TEXT NOT NULL,
+    dose REAL,
+    dose_std REAL,
+    PRIMARY KEY (sample, ion, date)
+);
+CREATE TABLE IF NOT EXISTS profiles (
+    measurement_id INTEGER NOT NULL REFERENCES measurements(id) ON DELETE CASCADE,
+    ion TEXT NOT NULL,
+    points INTEGER NOT NULL,
+    depth BLOB NOT NULL,
+    concentration BLOB NOT NULL,
+    PRIMARY KEY (measurement_id, ion)
+);
+DROP INDEX IF EXISTS measurements_sample;
+DROP INDEX IF EXISTS measurements_number;
+CREATE INDEX IF NOT EXISTS measurements_sample_nocase
+    ON measurements (sample COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS measurements_number_nocase
+    ON measurements (number COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS measurements_date ON measurements (date);
+CREATE INDEX IF NOT EXISTS ion_results_ion ON ion_results (ion);
+CREATE INDEX IF NOT EXISTS sample_means_ion ON sample_means (ion);
+CREATE INDEX IF NOT EXISTS sample_means_sample_nocase
+    ON sample_means (sample COLLATE NOCASE);
+"""
+
+
+def _pack(array):
+    return zlib.compress(np.ascontiguousarray(array, dtype=np.float64).tobytes())
+
+
+def _unpack(blob):
+    return np.frombuffer(zlib.decompress(blob), dtype=np.float64)
+
+
+class ResultsDB:
+    """Connection to results database file."""
+
+    def __init__(self, path="results.sqlite"):
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def close(self):
+        self.connection.close()
+
+    def ingest(self, datas, ion_names, means=(), profiles=False, date=None):
+        """Save results in one transaction. Results of already saved
+        filenames are replaced, their dates are kept unless given.
+
+        :datas: dicts from measure(), data["date"] (ISO) is the date of
+        measurement if present.
+        :ion_names: ion names of session.
+        :means: dicts from mean().
+        :profiles: save compressed depth and concentration arrays too.
+        :date: ISO date of measurements without their own, today by default
+        for new ones.
+
+        """
+        today = datetime.now().date().isoformat()
+        with self.connection:
+            cursor = self.connection.cursor()
+            cursor.executemany(
+                # upsert keeps id of saved filename, REPLACE would delete the row
+                # and cascade to its ion results and profiles; re-ingest does
+                # not move a measurement to the ingest date
+                "INSERT INTO measurements (filename, sample, number, date) "
+                "VALUES (?, ?, ?, ?) ON CONFLICT(filename) DO UPDATE SET "
+                "sample = excluded.sample, number = excluded.number, "
+                "date = coalesce(?, date)",
+                [
+                    (
+                        data["filename"],
+                        data["filename"].split("_", 1)[-1],
+                        data["filename"].split("_")[0],
+                        data.get("date", date) or today,
+                        data.get("date", date),
+                    )
+                    for data in datas
+                ],
+            )
+            ids = dict(
+                cursor.execute(
+                    "SELECT filename, id FROM measurements WHERE filename IN (%s)"
+                    % ",".join("?" * len(datas)),
+                    [data["filename"] for data in datas],
+                ).fetchall()
+            )
+            rows = [
+                (
+                    ids[data["filename"]],
+                    ion_name,
+                    float(data[ion_name + " dose"]),
+                    float(data[ion_name + " Rp"]),
+                    float(data[ion_name + " ΔRp"]),
+                    float(np.max(data[ion_name])),
+                )
+                for data in datas
+                for ion_name in ion_names
+                if ion_name in data
+            ]
+            cursor.executemany(
+                "INSERT OR REPLACE INTO ion_results VALUES (?, ?, ?, ?, ?, ?)", rows
+            )
+            cursor.executemany(
+                "INSERT OR REPLACE INTO sample_means VALUES (?, ?, ?, ?, ?)",
+                [
+                    (
+                        mean["sample"],
+                        ion_name,
+                        mean.get("date", date) or today,
+                        float(mean[ion_name + " dose"]),
+                        float(mean[ion_name + " dose std"]),
+                    )
+                    for mean in means
+                    for ion_name in ion_names
+                    if ion_name in mean
+                ],
+            )
+            if profiles:
+                cursor.executemany(
+                    "INSERT OR REPLACE INTO profiles VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (
+                            ids[data["filename"]],
+                            ion_name,
+                            len(data[ion_name]),
+                            _pack(data["depth"]),
+                            _pack(data[ion_name]),
+                        )
+                        for data in datas
+                        for ion_name in ion_names
+                        if ion_name in data
+                    ],
+                )
+
+    def doses(self, ion, sample=None, number=None, since=None, until=None):
+        """Doses of ion. sample and number can be SQL LIKE patterns
+        ('2-%' for all samples of family 2), dates are ISO strings.
+
+        :returns: list of (filename, sample, date, dose, Rp, ΔRp, peak)
+
+        """
+        query = (
+            "SELECT filename, sample, date, dose, rp, delta_rp, peak "
+            "FROM ion_results JOIN measurements ON measurement_id = id "
+            "WHERE ion = ?"
+        )
+        arguments = [ion]
+        for condition, value in (
+            ("sample LIKE ?", sample),
+            ("number LIKE ?", number),
+            ("date >= ?", since),
+            ("date <= ?", until),
+        ):
+            if value is not None:
+                query += " AND " + condition
+                arguments.append(value)
+        query += " ORDER BY date, filename"
+        return self.connection.execute(query, arguments).fetchall()
+
+    def means(self, ion, sample=None):
+        """Mean doses of ion per sample.
+
+        :returns: list of (sample, date, dose, dose std)
+
+        """
+        query = "SELECT sample, date, dose, dose_std FROM sample_means WHERE ion = ?"
+        arguments = [ion]
+        if sample is not None:
+            query += " AND sample LIKE ?"
+            arguments.append(sample)
+        query += " ORDER BY date, sample"
+        return self.connection.execute(query, arguments).fetchall()
+
+    def profile(self, filename, ion):
+        """Saved profile of ion.
+
+        :returns: depth, concentration or None if not saved.
+
+        """
+        row = self.connection.execute(
+            "SELECT depth, concentration FROM profiles "
+            "JOIN measurements ON measurement_id = id WHERE filename = ? AND ion = ?",
+            (filename, ion),
+        ).fetchone()
+        if row is None:
+            return None
+        return _unpack(row[0]), _unpack(row[1])
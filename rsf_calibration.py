@@ -0,0 +1,139 @@
+"""
+File: rsf_calibration.py
+Author: AleNriG
+Email: agorokhov94@gmail.com
+Github: https://github.com/alenrig
+Description: RSF calibration by implanted reference standards.
+
+References table is csv with a row for every reference ion:
+    file,ion,matrix,dose,speed,IA
+    ZLN062_ref-1_pos.csv,11B,30Si,1e15,0.52,0.8
+IA column is optional (1 by default). For every row ion/matrix is integrated
+over depth (time * speed) and RSF = dose * IA / integral * 1e7, like in
+small/rsf.py. Integrals of all rows are calculated in one pass over
+concatenated arrays. The result is RSF table for statistics.set_parameters:
+    ion,RSF,RSF std,references
+
+Usage: python3 rsf_calibration.py references.csv rsf_table.csv [bad points]
+"""
+import csv
+import sys
+
+import numpy as np
+
+
+def print_usage():
+    print("usage: " + sys.argv[0] + " REFERENCES_FILE RSF_TABLE_FILE [BAD_POINTS]")
+
+
+def _read_table(input_file):
+    """Read csv with header into list of dicts."""
+    with open(input_file, "r") as file:
+        return [
+            {key.strip(): value.strip() for key, value in row.items()}
+            for row in csv.DictReader(file)
+        ]
+
+
+def _read_columns(input_file, columns):
+    """Read only given columns of file.csv from converter.py.
+
+    :returns: dict('column': array, etc)
+
+    """
+    with open(input_file, "r") as file:
+        rows = list(csv.reader(file))
+    legend = rows.pop(0)
+    points = np.array(rows, dtype=float)
+    return {column: points[:, legend.index(column)] for column in columns}
+
+
+def integrals(grids, functions, bad_points=0):
+    """Trapezoid integrals of many functions on their own grids at once.
+
+    :grids: list of arrays.
+    :functions: list of arrays, same lengths as grids.
+    :bad_points: number of first points of every function to skip.
+    :returns: array of integrals.
+
+    """
+    grids = [grid[bad_points:] for grid in grids]
+    functions = [function[bad_points:] for function in functions]
+    lengths = np.array([len(grid) for grid in grids])
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    grid, function = np.concatenate(grids), np.concatenate(functions)
+
+    steps = np.zeros_like(grid)
+    steps[:-1] = (function[1:] + function[:-1]) / 2 * np.diff(grid)
+    # no steps between the last point of one file and the first of the next
+    steps[starts + lengths - 1] = 0
+    return np.add.reduceat(steps, starts)
+
+
+def calibrate(references, bad_points=0):
+    """Calculate RSF for every reference row.
+
+    :references: list of dicts from references table.
+    :returns: list of RSFs.
+
+    """
+    grids, ratios = [], []
+    for reference in references:
+        ion, matrix = reference["ion"], reference["matrix"]
+        data = _read_columns(reference["file"], ["time", ion, matrix])
+        grids.append(data["time"] * float(reference["speed"]))
+        ratios.append(data[ion] / data[matrix])
+    areas = integrals(grids, ratios, bad_points)
+    doses = np.array([float(reference["dose"]) for reference in references])
+    abundances = np.array(
+        [float(reference.get("IA") or 1) for reference in references]
+    )
+    return doses * abundances / areas * 10 ** 7
+
+
+def rsf_table(references, rsfs):
+    """Group RSFs by ion.
+
+    :returns: dict(ion: (RSF mean, RSF std, number of references))
+
+    """
+    table = {}
+    for reference, rsf in zip(references, rsfs):
+        table.setdefault(reference["ion"], []).append(rsf)
+    return {
+        ion: (np.mean(values), np.std(values), len(values))
+        for ion, values in table.items()
+    }
+
+
+def write_rsf_table(output_file, table):
+    with open(output_file, "w") as file:
+        writer = csv.writer(file)
+        writer.writerow(["ion", "RSF", "RSF std", "references"])
+        for ion, (rsf, std, number) in table.items():
+            writer.writerow([ion, f"{rsf:.6e}", f"{std:.6e}", number])
+
+
+def read_rsf_table(input_file):
+    """Read RSF table written by write_rsf_table().
+
+    :returns: dict(ion: RSF)
+
+    """
+    return {row["ion"]: float(row["RSF"]) for row in _read_table(input_file)}
+
+
+def main():
+    if len(sys.argv) not in (3, 4):
+        print_usage()
+        exit(1)
+    references = _read_table(sys.argv[1])
+    bad_points = int(sys.argv[3]) if len(sys.argv) == 4 else 0
+    table = rsf_table(references, calibrate(references, bad_points))
+    for ion, (rsf, std, number) in table.items():
+        print(f"{ion} RSF = {rsf:.3e} ± {std:.2e} ({number} references)")
+    write_rsf_table(sys.argv[2], table)
+
+
+if __name__ == "__main__":
+    main()
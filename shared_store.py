@@ -0,0 +1,184 @@
+"""
+File: shared_store.py
+Author: AleNriG
+Email: agorokhov94@gmail.com
+Github: https://github.com/alenrig
+Description: Profiles of a run kept once in shared memory for worker
+processes. All arrays of all measurements are packed into one
+multiprocessing.shared_memory block; workers get only a small descriptor
+(block name, offsets, shapes, scalars) and attach read-only NumPy views
+without copies. The block is removed when the store is closed, at
+interpreter exit, or by the multiprocessing resource tracker if the owner
+process dies; its memory is unmapped when the last view is released.
+
+Usage:
+    with shared_store.ProfileStore.from_files(datafiles) as store:
+        results = store.map(function, workers=8)  # function(data) in workers
+"""
+import atexit
+import contextlib
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+import loader
+
+ALIGNMENT = 64
+
+_register_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def _untracked():
+    """Skip resource tracker registration of blocks attached inside, for this
+    process only; the original register() is back on exit."""
+    with _register_lock:
+        register = resource_tracker.register
+        resource_tracker.register = lambda name, rtype: None
+        try:
+            yield
+        finally:
+            resource_tracker.register = register
+
+
+def _attach_block(name):
+    """Attach existing block without registering it in the resource tracker of
+    this process (it would remove the block when a worker exits)."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # python < 3.13
+        # unregister() after attach would drop registration of the owner when
+        # tracker process is shared (fork), so registration is skipped instead
+        with _untracked():
+            return shared_memory.SharedMemory(name=name)
+
+
+class _Mapping(np.ndarray):
+    """Bytes of a block and their slices, they hold the block object, so it is
+    not unmapped (by its garbage collection) while views based on them are
+    alive."""
+
+    def __array_finalize__(self, obj):
+        self.block = getattr(obj, "block", None)
+
+
+def _views(block, descriptor):
+    """dicts of read-only views of block arrays and scalars."""
+    mapping = np.ndarray(block.size, dtype=np.uint8, buffer=block.buf).view(_Mapping)
+    mapping.block = block
+    datas = []
+    for arrays, scalars in descriptor["index"]:
+        data = dict(scalars)
+        for name, (offset, dtype, shape) in arrays.items():
+            dtype = np.dtype(dtype)
+            size = int(np.prod(shape)) * dtype.itemsize
+            view = mapping[offset : offset + size].view(dtype).reshape(shape)
+            view = view.view(np.ndarray)
+            view.flags.writeable = False
+            data[name] = view
+        datas.append(data)
+    return datas
+
+
+class ProfileStore:
+    """Owner of shared block with profiles.
+
+    :datas: list of dicts ('filename': ..., 'time': [...], etc), numeric arrays
+    go to shared memory, other values are kept in descriptor.
+
+    """
+
+    def __init__(self, datas):
+        index, size = [], 0
+        for data in datas:
+            arrays, scalars = {}, {}
+            for name, value in data.items():
+                if isinstance(value, np.ndarray) and value.dtype.kind in "biuf":
+                    arrays[name] = (size, value.dtype.str, value.shape)
+                    size += -(-value.nbytes // ALIGNMENT) * ALIGNMENT
+                else:
+                    scalars[name] = value
+            index.append((arrays, scalars))
+
+        self.block = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        self.descriptor = dict(name=self.block.name, index=index)
+        atexit.register(self.close)
+        for data, (arrays, _) in zip(datas, index):
+            for name, (offset, dtype, shape) in arrays.items():
+                view = np.ndarray(
+                    shape, dtype=dtype, buffer=self.block.buf, offset=offset
+                )
+                view[...] = data[name]
+        self.datas = _views(self.block, self.descriptor)
+
+    @classmethod
+    def from_files(cls, datafiles, **kwargs):
+        """Read datafiles by loader.load() into store."""
+        return cls(list(loader.load(datafiles, **kwargs)))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def __len__(self):
+        return len(self.datas)
+
+    def __getitem__(self, number):
+        return self.datas[number]
+
+    def close(self):
+        """Remove the block, safe to call twice. Views taken from the store
+        stay valid, memory is unmapped when the last of them is released.
+        """
+        if self.block is None:
+            return
+        atexit.unregister(self.close)
+        self.block.unlink()
+        self.datas, self.block = [], None
+
+    def map(self, function, workers=None):
+        """Call function(data) for every measurement in worker processes.
+
+        :function: picklable (module level) function of one data dict.
+        :workers: number of processes, ProcessPoolExecutor default if None.
+        :returns: list of results in store order.
+
+        """
+        with ProcessPoolExecutor(
+            workers, initializer=_worker_attach, initargs=(self.descriptor,)
+        ) as pool:
+            return list(
+                pool.map(_worker_call, [function] * len(self), range(len(self)))
+            )
+
+
+# state of worker process
+_worker_block = None
+_worker_datas = None
+
+
+def attach(descriptor):
+    """Views of store in another process.
+
+    :descriptor: ProfileStore.descriptor
+    :returns: block, list of data dicts. Views keep the block mapped, it is
+    unmapped when they are released (block.close() before that invalidates
+    them).
+
+    """
+    block = _attach_block(descriptor["name"])
+    return block, _views(block, descriptor)
+
+
+def _worker_attach(descriptor):
+    global _worker_block, _worker_datas
+    _worker_block, _worker_datas = attach(descriptor)
+
+
+def _worker_call(function, number):
+    return function(_worker_datas[number])
@@ -5,6 +5,7 @@ Email: agorokhov94@gmail.com
 Github: https://github.com/alenrig
 Description: program for MINSK-Integral. Program collecting last points of
 user choise and count mean for each file and mean of all means for sample.
+Only the end of every file is read, files are processed in parallel.
 
 Copyright © 2018 AleNriG. All Rights Reserved.
 """
@@ -13,6 +14,11 @@ Copyright © 2018 AleNriG. All Rights Reserved.
 import csv
 import numpy as np
 import os
+from concurrent.futures import ThreadPoolExecutor
+from scipy import stats
+
+
+BLOCK_SIZE = 4096
 
 
 def file_read(file_input_path):
@@ -34,21 +40,74 @@ def file_read(file_input_path):
     return data
 
 
+def tail_read(file_input_path, rows):
+    """Read legend and only the last rows of file, seeking backwards from
+    the end by blocks. Cost depends on rows, not on file length.
+
+    :file_input_path: csv file.
+    :rows: number of last rows to read.
+    :returns: dict('ion 1': array, etc) of the last rows.
+
+    """
+    with open(file_input_path, 'rb') as file:
+        legend = next(csv.reader([file.readline().decode()]))
+        header_end = file.tell()
+        position = file.seek(0, os.SEEK_END)
+        tail, block_size, lines = b'', BLOCK_SIZE, []
+        while position > header_end and len(lines) < rows:
+            step = min(block_size, position - header_end)
+            position -= step
+            file.seek(position)
+            tail = file.read(step) + tail
+            block_size *= 2
+            # first line can be cut by the block border
+            lines = tail.split(b'\n')[0 if position == header_end else 1:]
+            lines = [line for line in lines if line.strip()]
+    points = np.array([line.decode().split(',') for line in lines[-rows:]],
+                      dtype=float).reshape(-1, len(legend))
+    return {element: points[:, number] for number, element in enumerate(legend)}
+
+
+def confidence_interval(values, level=0.95):
+    """Mean and half-width of Student confidence interval.
+
+    :values: array of values.
+    :level: confidence level.
+    :returns: (mean, half-width), half-width is nan for single value.
+
+    """
+    values = np.asarray(values, dtype=float)
+    mean = values.mean()
+    if len(values) < 2:
+        return mean, float('nan')
+    sem = values.std(ddof=1) / np.sqrt(len(values))
+    return mean, stats.t.ppf((1 + level) / 2, len(values) - 1) * sem
+
+
+def tail_mean(datafile, points, ion, matrix, abundance, rsf, level=0.95):
+    """Mean of ion / matrix / abundance * rsf over the last points of file.
+
+    :returns: (mean, half-width of confidence interval)
+
+    """
+    data = tail_read(datafile, points)
+    return confidence_interval(
+        data[ion] / data[matrix] / abundance * rsf, level)
+
+
 def file_write(result):
     """Write all results into file.
 
-    :result: TODO
+    :result: dict from mean_calc()
 
     """
     with open('result.txt', 'w') as file:
         for key, value in result.items():
             file.write(key)
-            means = []
-            for filename, mean in value.items():
-                file.write(
-                    '\nдля файла {} среднее - {:.3e}'.format(filename, mean))
-                means.append(mean)
-            file.write('\nсреднее {:.3e}'.format(np.mean(means)))
+            for filename, (mean, ci) in value['files'].items():
+                file.write('\nдля файла {} среднее - {:.3e} ± {:.3e}'.format(
+                    filename, mean, ci))
+            file.write('\nсреднее {:.3e} ± {:.3e}'.format(*value['mean']))
             file.write('\n---\n')
 
 
@@ -68,31 +127,49 @@ def combine_by_samples():
     return combined
 
 
-def mean_calc():
-    """Calculate mean for every file.
-    :returns: TODO
+def mean_calc(rsf, points, ion='11B', matrix='30Si', abundance=0.8,
+              level=0.95, workers=None):
+    """Calculate mean for every file and mean of file means for every
+    sample. Files are read in parallel.
 
-    """
-    rsf = float(input('Введите RSF: '))
-    points = int(input('Введите количество точек, по которым будет '
-                       'проводится рассчет: '))
+    :rsf: RSF of ion.
+    :points: number of last points to average.
+    :ion: ion name in files legend.
+    :matrix: matrix ion name in files legend.
+    :abundance: isotopic abundance of ion.
+    :level: confidence level of intervals.
+    :workers: number of threads, ThreadPoolExecutor default if None.
+    :returns: dict(sample: dict('files': dict(filename: (mean, ci)),
+    'mean': (mean, ci)))
 
+    """
     combined = combine_by_samples()
+    datafiles = sorted(set(datafile for value in combined.values()
+                           for datafile in value))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        means = dict(zip(datafiles, executor.map(
+            lambda datafile: tail_mean(datafile, points, ion, matrix,
+                                       abundance, rsf, level),
+            datafiles)))
+
     result = {}
     for key, value in combined.items():
-        means = {}
-        for datafile in value:
-            data = file_read(datafile)
-            filename = datafile.split('_')[0]
-            RSF = [alloy / matrix / 0.8 * rsf
-                   for alloy, matrix in zip(data['11B'], data['30Si'])]
-            mean = np.mean(RSF[-points:])
-            means.update({filename: mean})
-        result[key] = means
+        files = {datafile.split('_')[0]: means[datafile]
+                 for datafile in sorted(value)}
+        result[key] = dict(files=files, mean=confidence_interval(
+            [mean for mean, _ in files.values()], level))
     return result
 
 
 if __name__ == '__main__':
 
-    result = mean_calc()
+    ion = input('Введите ион [11B]: ') or '11B'
+    matrix = input('Введите ион матрицы [30Si]: ') or '30Si'
+    abundance = float(input('Введите изотопную распространенность '
+                            '[0.8]: ') or 0.8)
+    rsf = float(input('Введите RSF: '))
+    points = int(input('Введите количество точек, по которым будет '
+                       'проводится рассчет: '))
+
+    result = mean_calc(rsf, points, ion, matrix, abundance)
     file_write(result)
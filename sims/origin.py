@@ -6,12 +6,24 @@ Github: https://github.com/alenrig
 Description: program for conversation unique SIMS files into csv-files for
 import into Origin.
 Usage: simply start this program into the files of interest directory.
+    python origin.py                  - every file.txt into file.csv;
+    python origin.py merge [OUTPUT]   - all files into one wide table
+                                        (merged.csv by default), columns of
+                                        every run are prefixed by its name,
+                                        shorter runs are padded by empty cells.
 """
 
 
-import numpy as np
+import csv
 import os
-import pandas as pd
+import re
+import sys
+import tempfile
+
+import numpy as np
+
+MERGED_FILE = 'merged.csv'
+BLOCK_SIZE = 10000
 
 
 def read_file(file_input_path):
@@ -55,7 +67,7 @@ def cut_datapoints(full_file):
     bad_header = full_file[start_line]
     header = parse_ions(bad_header)
 
-    bad_points = full_text[start_line + 1:end_line]
+    bad_points = full_file[start_line + 1:end_line]
     datapoints = []
     for line in bad_points:
         datapoints.append(line)
@@ -72,14 +84,114 @@ def parse_ions(header):
     return [ion.replace(' ', '') for ion in filter(None, header.split('\t'))]
 
 
+def parse_datapoints(datapoints):
+    """Parse lines of datapoints into numbers, empty lines are skipped.
+
+    :datapoints: list of strings from cut_datapoints()
+    :returns: 2d numpy.array (points x columns)
+
+    """
+    lines = [line for line in datapoints if line.strip()]
+    return np.loadtxt(lines, ndmin=2)
+
+
+def column_names(header, columns):
+    """Names of data columns. Every ion has one column, or two: own time and
+    intensity.
+
+    :header: ion names from parse_ions()
+    :columns: number of data columns.
+    :returns: list of names.
+
+    """
+    if columns == len(header):
+        return header
+    if columns == 2 * len(header):
+        return [name for ion in header for name in ('time ' + ion, ion)]
+    raise ValueError('{} columns for {} ions'.format(columns, len(header)))
+
+
+def read_run(datafile):
+    """Read one file.
+
+    :returns: list of column names, 2d numpy.array of points.
+
+    """
+    header, datapoints = cut_datapoints(read_file(datafile))
+    points = parse_datapoints(datapoints)
+    return column_names(header, points.shape[1]), points
+
+
+def convert(datafile):
+    """Write file.txt as file.csv with numeric columns."""
+    names, points = read_run(datafile)
+    filename = datafile.split('.')[0]
+    with open(filename + '.csv', 'w', newline='') as file:
+        csv.writer(file).writerow(names)
+        np.savetxt(file, points, delimiter=',', fmt='%.10g')
+
+
+def _human_sort(datafile):
+    """Key for sorting names in human acceptable form (run2 before run10)."""
+    return [int(part) if part.isdigit() else part
+            for part in re.split(r'(\d+)', datafile)]
+
+
+def _format_block(block):
+    """Rows of block as text, nan (missing points of short runs) are empty."""
+    cells = np.char.mod('%.10g', block)
+    cells[np.isnan(block)] = ''
+    return ''.join(','.join(row) + '\n' for row in cells)
+
+
+def merge(files_list, output_file=MERGED_FILE, block_size=BLOCK_SIZE):
+    """Merge all runs into one wide table. Every run is parsed and put into a
+    temporary .npy file, so only one run is in memory; then the table is
+    written by blocks of rows from memory mapped runs.
+
+    :files_list: list of file.txt, output_file among them is skipped.
+    :output_file: merged file.csv
+    :block_size: number of rows written at once.
+    :returns: list of (run, number of points) in human sorted order.
+
+    """
+    output_path = os.path.abspath(output_file)
+    files_list = [datafile for datafile in files_list
+                  if os.path.abspath(datafile) != output_path]
+    runs, names = [], []
+    with tempfile.TemporaryDirectory() as temporary:
+        for number, datafile in enumerate(sorted(files_list, key=_human_sort)):
+            run = datafile.split('.')[0]
+            run_names, points = read_run(datafile)
+            path = os.path.join(temporary, '{}.npy'.format(number))
+            np.save(path, points)
+            runs.append((run, path, len(points)))
+            names += [run + '_' + name for name in run_names]
+            del points
+
+        arrays = [np.load(path, mmap_mode='r') for _, path, _ in runs]
+        length = max(len(array) for array in arrays)
+        with open(output_file, 'w', newline='') as file:
+            csv.writer(file).writerow(names)
+            for start in range(0, length, block_size):
+                stop = min(start + block_size, length)
+                block = np.full((stop - start, len(names)), np.nan)
+                column = 0
+                for array in arrays:
+                    part = array[start:stop]
+                    block[:len(part), column:column + array.shape[1]] = part
+                    column += array.shape[1]
+                file.write(_format_block(block))
+        del arrays
+    return [(run, points) for run, _, points in runs]
+
+
 if __name__ == "__main__":
     files_list = files_collector()
-    for datafile in files_list:
-        full_text = read_file(datafile)
-        header, datapoints = cut_datapoints(full_text)
-        datapoints = np.array(datapoints)
-
-        data = pd.DataFrame(datapoints)
-        data.columns = header
-        filename = datafile.split('.')[0]
-        data.to_csv(filename + '.csv', index=False, sep=',')
+    if len(sys.argv) > 1 and sys.argv[1] == 'merge':
+        output_file = sys.argv[2] if len(sys.argv) > 2 else MERGED_FILE
+        for run, points in merge(files_list, output_file):
+            print(run, points)
+    else:
+        for datafile in files_list:
+            convert(datafile)
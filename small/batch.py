@@ -0,0 +1,68 @@
+"""Batch calculation of small calculators formulas.
+Input csv must have a header with formula arguments names, output csv is
+input with result column added. All rows are calculated in one pass.
+
+Usage: python3 batch.py {decay,hmr,imf,rsf,weight} input.csv output.csv
+"""
+import csv
+import inspect
+import sys
+
+import numpy as np
+
+from formulas import FORMULAS
+
+
+def print_usage():
+    print("usage: " + sys.argv[0] + " {" + ",".join(FORMULAS) + "} INPUT_FILE OUTPUT_FILE")
+
+
+def read_table(file_path):
+    """Read csv with header into dict('column': array, etc)."""
+    with open(file_path) as file:
+        rows = list(csv.reader(file))
+    legend = [name.strip() for name in rows.pop(0)]
+    points = np.array(rows, dtype=float).reshape(-1, len(legend))
+    return {name: points[:, number] for number, name in enumerate(legend)}
+
+
+def calculate(name, table):
+    """Calculate formula for all rows of table.
+
+    :name: formula name from FORMULAS.
+    :table: dict('argument': array, etc).
+    :returns: array of results.
+
+    """
+    formula = FORMULAS[name]
+    arguments = inspect.signature(formula).parameters
+    missing = [argument for argument in arguments if argument not in table]
+    if missing:
+        raise KeyError("no columns for arguments: " + ", ".join(missing))
+    return formula(*(table[argument] for argument in arguments))
+
+
+def write_table(file_path, table):
+    """Write dict('column': array, etc) into csv in one pass."""
+    np.savetxt(
+        file_path,
+        np.column_stack(list(table.values())),
+        delimiter=",",
+        header=",".join(table),
+        comments="",
+        fmt="%.6e",
+    )
+
+
+def main():
+    if len(sys.argv) != 4 or sys.argv[1] not in FORMULAS:
+        print_usage()
+        exit(1)
+    name, input_path, output_path = sys.argv[1:]
+    table = read_table(input_path)
+    table[name] = calculate(name, table)
+    write_table(output_path, table)
+
+
+if __name__ == "__main__":
+    main()
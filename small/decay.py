@@ -1,13 +1,13 @@
 # Расчёт скорости спада.
 
-from math import log
+from formulas import decay_length
 
 while True:
     x1 = float(input('Input x1: '))
     y1 = float(input('Input y1: ')) # y1, y2 - точки, на которых сигнал упал в е раз.
     x2 = float(input('Input x2: '))
     y2 = float(input('Input y2: '))
-    l = -(x2 - x1) / log(y2 / y1)
+    l = decay_length(x1, y1, x2, y2)
     print("Decay length:", l)
 
     answer = input("Again? [y/n]: ")
@@ -0,0 +1,43 @@
+"""Formulas of small calculators as NumPy functions.
+Every argument can be a number or an array, arrays are broadcast like in
+ufuncs, so thousands of values are calculated in one call.
+"""
+import numpy as np
+
+
+def decay_length(x1, y1, x2, y2):
+    """Decay length by two points where signal falls by e times."""
+    x1, y1, x2, y2 = map(np.asarray, (x1, y1, x2, y2))
+    return -(x2 - x1) / np.log(y2 / y1)
+
+
+def hmr(mass1, mass2):
+    """High Mass Resolution needed to separate two masses."""
+    mass1, mass2 = np.asarray(mass1), np.asarray(mass2)
+    return mass2 / np.abs(mass1 - mass2)
+
+
+def imf(c1, c2, p1, p2):
+    """Instrumental mass fractionation by major and minor C and %."""
+    c1, c2, p1, p2 = map(np.asarray, (c1, c2, p1, p2))
+    return c2 * p1 / c1 / p2
+
+
+def rsf(dose, integral):
+    """RSF by dose and integral of I_n/I_M, with units conversion."""
+    dose, integral = np.asarray(dose), np.asarray(integral)
+    return dose / integral * 10 ** 7
+
+
+def weight(a, b, la, lb, x):
+    """Weight coefficient K_a for solid solution A_xB_(1-x)C.
+
+    a, b - mean intensities of A and B;
+    la, lb - natural abundances of A and B in %;
+    x - concentration of A from 0 to 1.
+    """
+    a, b, la, lb, x = map(np.asarray, (a, b, la, lb, x))
+    return x * b * la / 100 / lb / 100 / a / (1 - x)
+
+
+FORMULAS = dict(decay=decay_length, hmr=hmr, imf=imf, rsf=rsf, weight=weight)
@@ -1,9 +1,11 @@
 # Расчёт High Mass Resolution
 
+from formulas import hmr
+
 while True:
-    mass1 = eval(input('Input the 1st mass: '))
-    mass2 = eval(input('Input the 2nd mass: '))
-    HMR = mass2 / abs(mass1 - mass2)
+    mass1 = float(input('Input the 1st mass: '))
+    mass2 = float(input('Input the 2nd mass: '))
+    HMR = hmr(mass1, mass2)
     print('The value of HMR is:', int(HMR))
 
     print('Again? [y/n]: ')
@@ -1,5 +1,7 @@
 # Расчёт 
 
+from formulas import imf
+
 while True:
 
     c1 = float(input('Insert major C: '))
@@ -7,7 +9,7 @@ while True:
     p1 = float(input('Insert major %: '))
     p2 = float(input('Insert minor %: '))
 
-    IMF = c2 * p1 / c1 / p2
+    IMF = imf(c1, c2, p1, p2)
     print('IMF =', IMF)
 
     print('Again? [y/n]: ')
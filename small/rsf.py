@@ -1,9 +1,11 @@
 # Расчёт RSF с учётом единиц исчисления
 
+from formulas import rsf
+
 while True:
     D = float(input('input D: '))
     integer = float(input('input the result of integer of I_n/I_M: '))
-    RSF = D / integer * 10 ** 7
+    RSF = rsf(D, integer)
     print('RSF = %e' % RSF)
 
     answer = input('Again? [y/n]: ')
@@ -1,14 +1,29 @@
 #!/bin/bash
 
+# Interactive mode: ./start.sh
+# Batch mode:       ./start.sh {decay,hmr,imf,rsf,weight} input.csv output.csv
+
+python_interpreter=ipython3
+
+if [[ $# -gt 0 ]]
+then
+    python3 batch.py "$@"
+    exit $?
+fi
+
+programs(){
+ls *.py | grep -v -e '^formulas.py$' -e '^batch.py$'
+}
+
 chose(){
 echo "From this programs:"
-ls *.py; echo
-echo "Enter the name of one you need (without .py):" 
+programs; echo
+echo "Enter the name of one you need (without .py):"
 read prog; echo
 }
 
 chose
-if [[ ! -f ${prog}.py ]]
+if [[ ! -f ${prog}.py ]] || ! programs | grep -q "^${prog}.py$"
 then
     echo "Error! There is no such program, try again."
     chose
@@ -16,5 +31,4 @@ fi
 head -n 1 ${prog}.py
 
 # run program
-python_interpreter=ipython3
 ${python_interpreter} ${prog}.py
@@ -1,5 +1,7 @@
 #Вычисление весового коэффициент K_a для твёрдого раствора вида A_xB_(1-x)C.
 
+from formulas import weight
+
 while True:
     print('For your structure A_xB_(1-x)C, input theese data:')
     # А, В - средние значения интенсивности.
@@ -13,7 +15,7 @@ while True:
 
     # x - концентрация эл-та А.
     x = float(input('Input x - concentration (from 0 to 1): '))
-    k = x * b * la / 100 / lb / 100 / a / (1 - x)
+    k = weight(a, b, la, lb, x)
     print("Weight function for A:", k) 
     
     answer = input("Again? [y/n]: ")
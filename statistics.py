@@ -21,19 +21,38 @@ By now program calculate concentration profile for measurement, it dose;
 calculate mean of concentration profile in each point, mean dose
 and std of dose. Plot all measures and mean. Plot splined grapth.
 
+All parameters of calculations are kept in Session object. Numerical core
+needs only NumPy; SciPy and matplotlib are imported on the first plot.
+Usage from IPython or other scripts:
+    session = statistics.Session.interactive()  # or Session(ions, parameters)
+    data = session.measure("ZLN062_2-3_pos.csv", speed=0.5)
+
 Copyright © 2018 AleNriG. All Rights Reserved.
 """
+import contextlib
 import csv
-import math
+import functools
+import io
 import os
 import re
+import warnings
+from concurrent.futures import ProcessPoolExecutor
 from itertools import dropwhile
 
 import numpy as np
-import pandas as pd
-import scipy.interpolate as interpolate
-from matplotlib import pyplot as plt
-from scipy import signal
+
+import alignment
+import cache
+import chunked
+import decay_length
+import decimation
+import depth
+import dose_index
+import export
+import loader
+import pearson
+import profiling
+import rsf_calibration
 
 
 def _csv_grubber():
@@ -55,14 +74,16 @@ def _read_file(input_file):
 
     """
     data = dict(filename=input_file.rsplit("_", 1)[0])
-    with open(input_file, "r") as file:
-        legend, points = [], []
-        for line in csv.reader(file):
-            points.append(line)
-    legend = points.pop(0)
-    points = np.array(points)
-    for number, label in enumerate(legend):
-        data[label] = np.array(list(map(float, points[:, number])))
+    with profiling.stage("read_file") as stage:
+        with open(input_file, "r") as file:
+            legend, points = [], []
+            for line in csv.reader(file):
+                points.append(line)
+        legend = points.pop(0)
+        points = np.array(points)
+        for number, label in enumerate(legend):
+            data[label] = np.array(list(map(float, points[:, number])))
+        stage.add(bytes_read=os.path.getsize(input_file), items=points.size)
     return data
 
 
@@ -121,13 +142,13 @@ def _human_sort(x):
 
 def _integral(func, dx=1):
     """Calculate area under the function.
-    dx - step for trapz.
+    dx - step of the trapezoid rule.
 
     :data: dict('filename': filename, 'time': [...], etc)
     :returns: dict{'ion 1': area, etc}
 
     """
-    return np.trapz(func, dx=dx)
+    return dose_index.cumulative_dose(np.arange(len(func)) * dx, func)[-1]
 
 
 def _choice(lst):
@@ -146,348 +167,624 @@ def _choice(lst):
     return lst[choice]
 
 
+def _default_parameters():
+    """Parameters not depending on ions.
+
+    :returns: dict('graphs_output_format': ..., etc)
+
+    """
+    parameters = dict(graphs_output_format=".pdf")
+    parameters["data_output_format"] = ".txt"
+    # Formats of write_file(): 'csv', 'origin', 'binary' (see export.py).
+    parameters["export formats"] = ["csv"]
+    # Number of points on graphs, None to plot full profiles.
+    parameters["plot points"] = 2000
+    parameters["decimation"] = "minmax"
+    # Directory of derived results cache, None to calculate everything.
+    parameters["cache"] = cache.CACHE_DIR
+    # Align repeats by concentration of "align ion" (first ion if None) in mean().
+    parameters["align repeats"] = False
+    parameters["align ion"] = None
+    return parameters
+
+
 def set_parameters():
     """Set constant parameters for all measures.
 
     :returns: dict('speed': ..., 'RSF': ..., etc)
 
     """
-    parameters = dict(graphs_output_format=".pdf")
-    parameters["data_output_format"] = ".txt"
+    parameters = _default_parameters()
 
     # Gathering ions from datafiles.
     ions = sorted(list(_ions_set()), key=_human_sort)
     print("Choose matrix: ")
     parameters["matrix"] = _choice(ions)
+
+    # Erosion speed depending on matrix composition instead of constant one.
+    calibration = input("Speed calibration table (empty for constant speed): ")
+    if calibration:
+        parameters["speed calibration"] = depth.read_speed_calibration(calibration)
     # delete matrix from ions
     ions.remove(parameters["matrix"])
 
+    # RSF table from rsf_calibration.py, missing ions are asked by hand.
+    rsf_table = input("RSF table (empty to input by hand): ")
+    rsfs = rsf_calibration.read_rsf_table(rsf_table) if rsf_table else {}
+
     for ion in ions:
         # IA -- Isotopic Abundance
         parameters[ion + " IA"] = float(input(ion + " IA: "))
         while 1 < parameters[ion + " IA"] or parameters[ion + " IA"] <= 0:
             print("Isotopic Abundance can be only in range from 0 to 1")
             parameters[ion + " IA"] = float(input(ion + " IA: "))
-        parameters[ion + " RSF"] = float(input(ion + " RSF: "))
+        if ion in rsfs:
+            parameters[ion + " RSF"] = rsfs[ion]
+            print(f"{ion} RSF: {rsfs[ion]:.3e}")
+        else:
+            parameters[ion + " RSF"] = float(input(ion + " RSF: "))
     return ions, parameters
 
 
-def _area_calculator(datafile):
-    """Calculate area under the ion/matrix function for each file in current
-    directory.
+class Session:
+    """Parameters of calculations for a set of measurements.
 
-    :datafile: inputed file (example: 'ZLN062_2-3')
-    :returns: dict('ion 1': area, etc).
+    :ions: list of ions (without matrix), e.g. ['11B', '31P'].
+    :parameters: dict('matrix': ..., 'ion 1 IA': ..., 'ion 1 RSF': ..., etc),
+    missing output parameters are taken by default.
+    :bad_points: number of first bad points in data.
+    :spline_dots: number of points of splined graph.
 
     """
-    areas = {}
-    data = _read_file(datafile)
-    dx = np.diff(data["time"]).mean()
-    for ion in ions:
-        if ion in data:
-            func = np.array(
-                [i / m for i, m in zip(data[ion], data[parameters["matrix"]])]
-            )
-            areas[ion] = _integral(func[bad_points:], dx=dx)
-    return areas
 
+    def __init__(self, ions, parameters, bad_points=0, spline_dots=1000):
+        self.ions = list(ions)
+        self.parameters = _default_parameters()
+        self.parameters.update(parameters)
+        self.bad_points = bad_points
+        self.spline_dots = spline_dots
+        self.ion_names = list(map(_strip_ion_name, self.ions))
+
+    @classmethod
+    def interactive(cls):
+        """Ask all parameters from user for datafiles in current directory."""
+        bad_points = int(input("Bad points: "))  # first points in data is bad
+        ions, parameters = set_parameters()
+        spline_dots = int(input("Dots for spline: "))
+        return cls(ions, parameters, bad_points, spline_dots)
+
+    def _area_calculator(self, data):
+        """Calculate area under the ion/matrix function for each file in current
+        directory.
+
+        :data: dict from _read_file()
+        :returns: dict('ion 1': area, etc).
+
+        """
+        areas = {}
+        dx = np.diff(data["time"]).mean()
+        for ion in self.ions:
+            if ion in data:
+                func = data[ion] / data[self.parameters["matrix"]]
+                areas[ion] = _integral(func[self.bad_points :], dx=dx)
+        return areas
+
+    def compare_ions_intencity(self):
+        """Print areas under the functions of ion/matrix for all datafiles in
+        current directory. Areas are calculated in loader worker processes,
+        one pool for all samples.
+
+        """
+        compute = functools.partial(_areas, self)
+        with ProcessPoolExecutor() as pool:
+            for sample, datafiles in _samples().items():
+                print(f"{sample:*^30}")
+                for filename, areas in loader.load(
+                    datafiles, compute=compute, pool=pool
+                ):
+                    print(f'{filename.split("_")[0]:-^15}')
+                    for ion, area in areas.items():
+                        print(f"{ion} area = {area:.3g}")
+                print(border)
+
+    def _concentration_calculator(self, data, ion):
+        return (
+            data[ion]
+            / self.parameters[ion + " IA"]
+            / data[self.parameters["matrix"]]
+            * self.parameters[ion + " RSF"]
+        )
 
-def compare_ions_intencity():
-    """Print areas under the functions of ion/matrix for all datafiles in
-    current directory.
-
-    """
-    for sample, datafiles in _samples().items():
-        print(f"{sample:*^30}")
-        datafiles = sorted(datafiles)
-        for datafile in datafiles:
-            print(f'{datafile.split("_")[0]:-^15}')
-            for ion, area in _area_calculator(datafile).items():
-                print(f"{ion} area = {area:.3g}")
-        print(border)
+    def _cache_key(self, data, ion):
+        """Key of ion results: depth (so speed), ion and matrix signals and
+        parameters of this ion only."""
+        return cache.key(
+            data["depth"],
+            data[ion],
+            data[self.parameters["matrix"]],
+            self.parameters[ion + " IA"],
+            self.parameters[ion + " RSF"],
+            self.bad_points,
+        )
 
+    def _speed(self, filename, speed=None):
+        """Erosion speed of file, asked if not given. None with speed
+        calibration table in parameters."""
+        if speed is None and "speed calibration" not in self.parameters:
+            speed = float(input("Speed for " + filename + ": "))
+        return speed
+
+    def _concentration(self, data, speed=None):
+        """Calculate atomic concentration profile.
+        Add a ['depth'] and ['concentration'] keys with values in data, and
+        ['ion 1 cumulative dose'] integrated on the true depth grid.
+        Ions with unchanged inputs are taken from cache with their Rp and ΔRp.
+
+        :data: dict('filename': filename, 'time': [...], etc)
+        :speed: erosion speed, asked if not given.
+        :returns: dict('ion name 1': cache key, etc) of calculated (not cached)
+        ions.
+
+        """
+        speed = self._speed(data["filename"], speed)
+        parameters = self.parameters
+        with profiling.stage("concentration") as stage:
+            if speed is None:
+                data["depth"] = depth.composition_depth(
+                    data, parameters["speed calibration"]
+                )
+            else:
+                data["depth"] = data["time"] * speed
+
+            missed = {}
+            for ion in self.ions:
+                if ion in data:
+                    ion_name = _strip_ion_name(ion)
+                    if parameters["cache"] is not None:
+                        key = self._cache_key(data, ion)
+                        cached = cache.load(key, parameters["cache"])
+                        if cached is not None:
+                            data.update(cached)
+                            continue
+                        missed[ion_name] = key
+                    data[ion_name] = self._concentration_calculator(data, ion)
+                    cumulative = dose_index.cumulative_dose(
+                        data["depth"], data[ion_name], self.bad_points
+                    )
+                    data[ion_name + " cumulative dose"] = cumulative
+                    data[ion_name + " dose"] = cumulative[-1]
+                    stage.add(items=data[ion_name].size)
+        return missed
+
+    def _cache_store(self, data, keys):
+        """Save results of ions to cache.
+
+        :keys: dict('ion name 1': cache key, etc) from _concentration()
+
+        """
+        for ion_name, key in keys.items():
+            cache.store(
+                key,
+                {
+                    name: data[name]
+                    for name in (
+                        ion_name,
+                        ion_name + " cumulative dose",
+                        ion_name + " dose",
+                        ion_name + " Rp",
+                        ion_name + " ΔRp",
+                        ion_name + " γ",
+                        ion_name + " β",
+                    )
+                },
+                self.parameters["cache"],
+            )
 
-def _concentration_calculator(data, ion):
-    return np.array(
-        [
-            i / parameters[ion + " IA"] / m * parameters[ion + " RSF"]
-            for i, m in zip(data[ion], data[parameters["matrix"]])
+    @profiling.timed("reper_point")
+    def _reper_point(self, data, names=None):
+        """Calculate Reper point of ions: Rp, ΔRp, skewness γ and kurtosis β,
+        all ions at once (see pearson.moments). Bad points are skipped, as in
+        dose.
+
+        :data: dict('filename': ..., 'time': [...], 'depth': [...],
+        'ion 1': [...], etc, 'concentration 1': [...], etc)
+        :names: ion names to calculate, all ion_names by default.
+
+        """
+        names = [
+            ion_name
+            for ion_name in (self.ion_names if names is None else names)
+            if ion_name in data
         ]
-    )
+        if not names:
+            return
+        concentrations = np.array([data[ion_name] for ion_name in names], dtype=float)
+        concentrations[:, : self.bad_points] = np.nan
+        rps, delta_rps, gammas, betas = pearson.moments(data["depth"], concentrations)
+        for ion_name, rp, delta_rp, gamma, beta in zip(
+            names, rps, delta_rps, gammas, betas
+        ):
+            data[ion_name + " Rp"] = rp
+            data[ion_name + " ΔRp"] = delta_rp
+            data[ion_name + " γ"] = gamma
+            data[ion_name + " β"] = beta
+
+    def pearson(self, data):
+        """Add Pearson IV profiles with moments of measured ones as
+        ['ion 1 Pearson IV'], etc keys (nan if moments are out of Pearson IV
+        region).
+
+        :data: dict from measure()
+
+        """
+        for ion_name, profile in (
+            pearson.fit([data], self.ion_names).get(data["filename"], {}).items()
+        ):
+            data[ion_name + " Pearson IV"] = profile
+        return data
+
+    def decay_lengths(self, *datas):
+        """Decay lengths of trailing edges of all ions.
+
+        :datas: dicts from measure()
+        :returns: dict(filename: dict(ion_name: (decay length, std)))
+
+        """
+        return decay_length.decay_lengths(
+            datas, self.ion_names, bad_points=self.bad_points
+        )
 
+    def _cumulative(self, data):
+        names = [
+            ion_name
+            for ion_name in self.ion_names
+            if ion_name + " cumulative dose" in data
+        ]
+        return names, np.array([data[name + " cumulative dose"] for name in names])
 
-def _concentration(data):
-    """Calculate atomic concentration profile.
-    Add a ['depth'] and ['concentration'] keys with values in data.
+    def range_dose(self, data, starts, stops):
+        """Doses of all ions between depths, e.g. range_dose(data, [50], [120]).
 
-    :data: dict('filename': filename, 'time': [...], etc)
+        :data: dict from measure()
+        :starts, stops: arrays of ranges borders.
+        :returns: dict('ion 1': array of doses of ranges, etc)
 
-    """
-    speed = float(input("Speed for " + data["filename"] + ": "))
-    data["depth"] = data["time"] * speed
-    dx = np.diff(data["depth"]).mean()
+        """
+        names, cumulative = self._cumulative(data)
+        doses = dose_index.range_dose(data["depth"], cumulative, starts, stops)
+        return dict(zip(names, doses))
 
-    for ion in ions:
-        if ion in data:
-            ion_name = _strip_ion_name(ion)
-            data[ion_name] = _concentration_calculator(data, ion)
-            data[ion_name + " dose"] = _integral(data[ion_name][bad_points:], dx=dx)
+    def quantile_depth(self, data, quantiles):
+        """Depths holding given parts of dose of all ions, e.g. 0.9 for depth
+        containing 90% of dose.
 
+        :data: dict from measure()
+        :quantiles: array of parts of dose.
+        :returns: dict('ion 1': array of depths, etc)
 
-def _reper_point(data):
-    """Calculate Reper point of ions.
+        """
+        names, cumulative = self._cumulative(data)
+        depths = dose_index.quantile_depth(data["depth"], cumulative, quantiles)
+        return dict(zip(names, depths))
 
-    :data: dict('filename': ..., 'time': [...], 'depth': [...],
-    'ion 1': [...], etc, 'concentration 1': [...], etc)
+    def _print_measure(self, data):
+        print(border)
+        print(f'{data["filename"]:-^15}')
+        for ion_name in self.ion_names:
+            if ion_name + " dose" in data:
+                print(f"{ion_name} Rp = {data[ion_name + ' Rp']:.3e}")
+                print(f"{ion_name} ΔRp = {data[ion_name + ' ΔRp']:.3e}")
+                print(f"{ion_name} γ = {data[ion_name + ' γ']:.3f}")
+                print(f"{ion_name} β = {data[ion_name + ' β']:.3f}")
+                print(f"{ion_name} dose = {data[ion_name + ' dose']:.3e}")
+        print(border)
 
-    """
-    for ion_name in ion_names:
-        if ion_name in data:
-            data[ion_name + " Rp"] = np.sum(
-                [
-                    x * C / data[ion_name + " dose"]
-                    for x, C in zip(data["depth"], data[ion_name])
-                ]
+    def measure(self, datafile=None, data=None, speed=None):
+        """Return a measured chosen datafile with calculated concentration.
+
+        :data: already read datafile (from loader.load()), instead of datafile.
+        :speed: erosion speed, asked if not given.
+        :returns: dict('filename': filename, 'time': [...], 'depth': [...],
+        'ion 1': [...], etc, 'concentration 1': [...], etc)
+
+        """
+        if data is None and datafile is None:
+            files_list = sorted(_csv_grubber())
+            print("Choose file:")
+            data = _read_file(_choice(files_list))
+        elif data is None:
+            data = _read_file(datafile)
+
+        missed = self._concentration(data, speed)
+        if self.parameters["cache"] is None:
+            self._reper_point(data)
+        else:
+            self._reper_point(data, missed)
+            self._cache_store(data, missed)
+
+        self._print_measure(data)
+        return data
+
+    def measure_chunked(self, datafile, speed=None, chunk_size=chunked.CHUNK_SIZE):
+        """Measure very long datafile block by block with bounded memory.
+        Concentration profile is written to file.txt while reading, only doses,
+        Rp and ΔRp are kept in memory.
+
+        :returns: dict('filename': filename, 'ion 1 dose': ..., 'ion 1 Rp': ...,
+        'ion 1 ΔRp': ..., etc)
+
+        """
+        filename = datafile.rsplit("_", 1)[0]
+        speed = self._speed(filename, speed)
+        with profiling.stage("measure_chunked"):
+            data = chunked.measure(
+                datafile,
+                self.ions,
+                self.parameters,
+                speed=speed,
+                bad_points=self.bad_points,
+                chunk_size=chunk_size,
+                output_file=filename + self.parameters["data_output_format"],
             )
-            data[ion_name + " ΔRp"] = math.sqrt(
-                np.sum(
-                    [
-                        (x - data[ion_name + " Rp"]) ** 2 * C / data[ion_name + " dose"]
-                        for x, C in zip(data["depth"], data[ion_name])
-                    ]
+        self._print_measure(data)
+        return data
+
+    def _means_calculator(self, means, *datas):
+        """Stack profiles of every ion from all input datas (cut to the shortest),
+        align them if parameters["align repeats"] and calculate mean of
+        measurements point by point. Calculate mean of doses and doses std.
+
+        :means: dict("sample": sample)
+        :*datas: all inputed datas to calculate mean from them.
+
+        """
+        length = min(len(data["depth"]) for data in datas)
+        means["depth"] = np.mean([data["depth"][:length] for data in datas], axis=0)
+
+        lags = None
+        if self.parameters["align repeats"] and len(datas) > 1:
+            align_ion = self.parameters["align ion"] or self.ion_names[0]
+            numbers = [number for number, data in enumerate(datas) if align_ion in data]
+            missing = [data["filename"] for data in datas if align_ion not in data]
+            if missing:
+                warnings.warn(
+                    f"no {align_ion} in {', '.join(missing)}, they are not aligned"
                 )
-            )
-
-
-def measure(datafile=None):
-    """Return a measured chosen datafile with calculated concentration.
-
-    :returns: dict('filename': filename, 'time': [...], 'depth': [...],
-    'ion 1': [...], etc, 'concentration 1': [...], etc)
-
-    """
-    if datafile is None:
-        files_list = sorted(_csv_grubber())
-        print("Choose file:")
-        data = _read_file(_choice(files_list))
-    else:
-        data = _read_file(datafile)
-
-    _concentration(data)
-    _reper_point(data)
-
-    print(border)
-    print(f'{data["filename"]:-^15}')
-    for ion_name in ion_names:
-        if ion_name in data:
-            print(f"{ion_name} Rp = {data[ion_name + ' Rp']:.3e}")
-            print(f"{ion_name} ΔRp = {data[ion_name + ' ΔRp']:.3e}")
-            print(f"{ion_name} dose = {data[ion_name + ' dose']:.3e}")
-    print(border)
-    return data
-
-
-def _means_calculator(means, *datas):
-    """Create a list of lists of measurements for each ion from every input data.
-    Calculate mean of measurements point by point. Calculate mean of doses and
-    doses std.
-
-    :means: dict("sample": sample)
-    :*datas: all inputed datas to calculate mean from them.
-
-    """
-    means["depth"] = []
-    for ion_name in ion_names:
-        means[ion_name] = []
-        means[ion_name + " dose"] = []
-        means[ion_name + " dose std"] = []
-
-    for data in datas:
-        means["depth"].append(data["depth"])
-        for key, value in data.items():
-            if key in ion_names:
-                means[key].append(value)
-                means[key + " dose"].append(data[key + " dose"])
-
-    means["depth"] = np.array([np.mean(i) for i in zip(*means["depth"])])
-    for key, values in means.items():
-        if key in ion_names:
-            means[key] = np.array([np.mean(i) for i in zip(*values)])
-            means[key + " dose std"] = np.std(means[key + " dose"])
-            means[key + " dose"] = np.mean(means[key + " dose"])
-
-
-def mean(*datas, sample=None):
-    """Calculate means for all inputted data of given sample.
-    If sample is not given - read firs filename and take it from there.
-
-    :*datas: data1, data2, etc
-    :sample: sample ID
-    :returns: dict('depth': [...], 'ion1 mean': [...], ...,
-    'ion 1 std': [...], etc)
+            lags = np.zeros(len(datas))
+            if numbers:
+                signals = np.array(
+                    [datas[number][align_ion][:length] for number in numbers]
+                )
+                lags[numbers] = alignment.shifts(signals[0], signals)
+            step = (means["depth"][-1] - means["depth"][0]) / (length - 1)
+            means["shifts"] = {
+                data["filename"]: lag * step for data, lag in zip(datas, lags)
+            }
+
+        for ion_name in self.ion_names:
+            numbers = [number for number, data in enumerate(datas) if ion_name in data]
+            if not numbers:
+                continue
+            ion_datas = [datas[number] for number in numbers]
+            profiles = np.array([data[ion_name][:length] for data in ion_datas])
+            if lags is not None:
+                profiles = alignment.resample(profiles, lags[numbers])
+            means[ion_name] = np.nanmean(profiles, axis=0)
+            doses = [data[ion_name + " dose"] for data in ion_datas]
+            means[ion_name + " dose"] = np.mean(doses)
+            means[ion_name + " dose std"] = np.std(doses)
+
+    def mean(self, *datas, sample=None):
+        """Calculate means for all inputted data of given sample.
+        If sample is not given - read firs filename and take it from there.
+
+        :*datas: data1, data2, etc
+        :sample: sample ID
+        :returns: dict('depth': [...], 'ion1 mean': [...], ...,
+        'ion 1 std': [...], etc)
+
+        """
+
+        # if function running from interpretor.
+        if sample is None:
+            filenames = [data["filename"] for data in datas]
+            sample = filenames[0].rsplit("_")[0]
+
+        means = dict(sample=sample)
+        self._means_calculator(means, *datas)
 
-    """
+        print(f"{sample:*^30}")
+        for ion_name in self.ion_names:
+            if ion_name in means:
+                print(f"{ion_name} mean dose = {means[ion_name + ' dose']:.3e}")
+                print(f"{ion_name} dose std = {means[ion_name + ' dose std']:.3e}")
+        for filename, shift in means.get("shifts", {}).items():
+            print(f"{filename} shift = {shift:.3g}")
+        print(border)
 
-    # if function running from interpretor.
-    if sample is None:
-        filenames = [data["filename"] for data in datas]
-        sample = filenames[0].rsplit("_")[0]
+        return means
+
+    def write_file(self, dict_of_data):
+        """Save inputed dictionary to file.txt and other formats from
+        parameters["export formats"] (see export.py). Only profile arrays are
+        written, doses and other scalars are skipped.
+
+        :dict_of_data: dict from measure() or from mean()
+        :returns: list of written files.
+
+        """
+        if "filename" in dict_of_data:
+            output_prefix = dict_of_data["filename"]
+        elif "sample" in dict_of_data:
+            output_prefix = dict_of_data["sample"]
+        else:
+            raise ValueError("dict_of_data must be a result of measure() or mean()")
+        with profiling.stage("write_file") as stage:
+            paths = export.write(
+                dict_of_data,
+                output_prefix,
+                self.parameters["export formats"],
+                self.ion_names,
+                dict(csv=self.parameters["data_output_format"]),
+            )
+            stage.add(bytes_written=sum(os.path.getsize(path) for path in paths))
+        return paths
+
+    def _plot_decimated(self, x, y, **kwargs):
+        """Plot profile decimated to parameters["plot points"]."""
+        from matplotlib import pyplot as plt
+
+        plt.plot(
+            *decimation.decimate(
+                x, y, self.parameters["plot points"], self.parameters["decimation"]
+            ),
+            **kwargs,
+        )
 
-    means = dict(sample=sample)
-    _means_calculator(means, *datas)
+    @profiling.timed("plot")
+    def plot(self, dict_of_data):
+        """Plot inputted dictionary. If dict_of_data is mean -- plot splined as well.
+        Save grapths as file.pdf.
+
+        :dict_of_data: dict from measure() or from mean()
+
+        """
+        import scipy.interpolate as interpolate
+        from matplotlib import pyplot as plt
+        from scipy import signal
+
+        ion_names, parameters = self.ion_names, self.parameters
+
+        # if dict_of_data is one measure.
+        if "filename" in dict_of_data:
+            plt.figure()
+            plt.title(dict_of_data["filename"])
+            for ion_name in ion_names:
+                if ion_name in dict_of_data:
+                    self._plot_decimated(
+                        dict_of_data["depth"], dict_of_data[ion_name], label=ion_name
+                    )
+            plt.yscale("log")
+            plt.ylabel("Atomic concentration, cm$^{-3}$")
+            plt.xlim(left=0)
+            plt.xlabel("Depth, nm")
+            plt.grid(True)
+            plt.legend()
+            plt.show(block=False)
+            plt.savefig(dict_of_data["filename"] + parameters["graphs_output_format"])
+
+        # if dict_of_data is mean of several measures.
+        elif "sample" in dict_of_data:
+            plt.figure()
+            plt.title(dict_of_data["sample"] + " Mean")
+            for ion_name in ion_names:
+                if ion_name in dict_of_data:
+                    peaks, _ = signal.find_peaks(dict_of_data[ion_name], height=1e17)
+                    self._plot_decimated(
+                        dict_of_data["depth"], dict_of_data[ion_name], label=ion_name
+                    )
+                    # noisy profiles have thousands of peaks, they are
+                    # decimated as the profile itself
+                    self._plot_decimated(
+                        dict_of_data["depth"][peaks],
+                        dict_of_data[ion_name][peaks],
+                        marker="x",
+                        linestyle="none",
+                    )
+
+            plt.yscale("log")
+            plt.ylabel("Atomic concentration, cm$^{-3}$")
+            plt.xlim(left=0)
+            plt.xlabel("Depth, nm")
+            plt.grid(True)
+            plt.legend()
+            plt.show(block=False)
+            plt.savefig(dict_of_data["sample"] + parameters["graphs_output_format"])
+
+            # Spline plot.
+            dict_of_data["depth splined"] = np.linspace(
+                dict_of_data["depth"][0], dict_of_data["depth"][-1], self.spline_dots
+            )
 
-    print(f"{sample:*^30}")
-    for ion_name in ion_names:
-        if ion_name in means:
-            print(f"{ion_name} mean dose = {means[ion_name + ' dose']:.3e}")
-            print(f"{ion_name} dose std = {means[ion_name + ' dose std']:.3e}")
-    print(border)
+            plt.figure()
+            plt.title(dict_of_data["sample"] + " Spline")
+            for ion_name in ion_names:
+                if ion_name in dict_of_data:
+                    # BSpline magic
+                    with profiling.stage("spline") as stage:
+                        t, c, k = interpolate.splrep(
+                            dict_of_data["depth"], dict_of_data[ion_name], s=0, k=4
+                        )
+                        spline = interpolate.BSpline(t, c, k, extrapolate=False)
+                        splined = spline(dict_of_data["depth splined"])
+                        stage.add(items=splined.size)
+                    self._plot_decimated(
+                        dict_of_data["depth splined"], splined, label=ion_name
+                    )
+            plt.yscale("log")
+            plt.ylabel("Atomic concentration, cm$^{-3}$")
+            plt.xlim(left=0)
+            plt.xlabel("Depth, nm")
+            plt.grid(True)
+            plt.legend()
+            plt.show(block=False)
+            plt.savefig(
+                dict_of_data["sample"] + "_splined" + parameters["graphs_output_format"]
+            )
 
-    return means
+        else:
+            print("fuck")
 
 
-def write_file(dict_of_data):
-    """Save inputed dictionary to file.txt.
-    Function use pandas to correct saving of dictionary. It is necessary to
-    remove some values fro a dataframe (example: 'sample').
+def _areas(session, data):
+    """Compute stage of loader.load() for compare_ions_intencity().
 
-    :dict_of_data: dict from measure() or from mean()
+    :returns: filename, dict('ion 1': area, etc)
 
     """
-    dataframe = pd.DataFrame.from_dict(dict_of_data)
-    if "filename" in dict_of_data:
-        del dataframe["filename"]
-        for ion_name in ion_names:
-            if ion_name in dict_of_data:
-                # remove excessive data
-                del dataframe[ion_name + " dose"], dataframe[ion_name + " Rp"]
-                del dataframe[ion_name + " ΔRp"]
-        dataframe.to_csv(
-            dict_of_data["filename"] + parameters["data_output_format"],
-            index=False,
-            sep=",",
-        )
-    elif "sample" in dict_of_data:
-        del dataframe["sample"]
-        for ion_name in ion_names:
-            if ion_name in dict_of_data:
-                # remove excessive data
-                del dataframe[ion_name + " dose"]
-                del dataframe[ion_name + " dose std"]
-        dataframe.to_csv(
-            dict_of_data["sample"] + parameters["data_output_format"],
-            index=False,
-            sep=",",
-        )
-    else:
-        print("fuck")
+    return data["filename"], session._area_calculator(data)
 
 
-def plot(dict_of_data):
-    """Plot inputted dictionary. If dict_of_data is mean -- plot splined as well.
-    Save grapths as file.pdf.
-
-    :dict_of_data: dict from measure() or from mean()
+def _measured(session, speed, data):
+    """Compute stage of loader.load(): measure() with known speed (None with
+    speed calibration table), printing is left to the caller.
 
     """
-
-    # if dict_of_data is one measure.
-    if "filename" in dict_of_data:
-        plt.figure()
-        plt.title(dict_of_data["filename"])
-        for ion_name in ion_names:
-            if ion_name in dict_of_data:
-                plt.plot(dict_of_data["depth"], dict_of_data[ion_name], label=ion_name)
-        plt.yscale("log")
-        plt.ylabel("Atomic concentration, cm$^{-3}$")
-        plt.xlim(left=0)
-        plt.xlabel("Depth, nm")
-        plt.grid(True)
-        plt.legend()
-        plt.show(block=False)
-        plt.savefig(dict_of_data["filename"] + parameters["graphs_output_format"])
-
-    # if dict_of_data is mean of several measures.
-    elif "sample" in dict_of_data:
-        plt.figure()
-        plt.title(dict_of_data["sample"] + " Mean")
-        for ion_name in ion_names:
-            if ion_name in dict_of_data:
-                peaks, _ = signal.find_peaks(dict_of_data[ion_name], height=1e17)
-                plt.plot(dict_of_data["depth"], dict_of_data[ion_name], label=ion_name)
-                plt.plot(
-                    dict_of_data["depth"][peaks], dict_of_data[ion_name][peaks], "x"
-                )
-
-        plt.yscale("log")
-        plt.ylabel("Atomic concentration, cm$^{-3}$")
-        plt.xlim(left=0)
-        plt.xlabel("Depth, nm")
-        plt.grid(True)
-        plt.legend()
-        plt.show(block=False)
-        plt.savefig(dict_of_data["sample"] + parameters["graphs_output_format"])
-
-        # Spline plot.
-        dict_of_data["depth splined"] = np.linspace(
-            dict_of_data["depth"][0], dict_of_data["depth"][-1], spline_dots
-        )
-
-        plt.figure()
-        plt.title(dict_of_data["sample"] + " Spline")
-        for ion_name in ion_names:
-            if ion_name in dict_of_data:
-                # BSpline magic
-                t, c, k = interpolate.splrep(
-                    dict_of_data["depth"], dict_of_data[ion_name], s=0, k=4
-                )
-                spline = interpolate.BSpline(t, c, k, extrapolate=False)
-                plt.plot(
-                    dict_of_data["depth splined"],
-                    spline(dict_of_data["depth splined"]),
-                    label=ion_name,
-                )
-        plt.yscale("log")
-        plt.ylabel("Atomic concentration, cm$^{-3}$")
-        plt.xlim(left=0)
-        plt.xlabel("Depth, nm")
-        plt.grid(True)
-        plt.legend()
-        plt.show(block=False)
-        plt.savefig(
-            dict_of_data["sample"] + "_splined" + parameters["graphs_output_format"]
-        )
-
-    else:
-        print("fuck")
+    with contextlib.redirect_stdout(io.StringIO()):
+        return session.measure(data=data, speed=speed)
 
 
 def main():
-    """Automatic calculations for sample.
+    """Automatic calculations for sample."""
+    session = Session.interactive()
+    # with speed calibration no speed is asked, so files are measured in
+    # worker processes too; otherwise speed of every file is asked here
+    compute = None
+    if "speed calibration" in session.parameters:
+        compute = functools.partial(_measured, session, None)
+    with ProcessPoolExecutor() as pool:
+        while True:
+            print("Choose sample: ")
+            sample = _choice(sorted(list(_samples().keys()), key=_human_sort))
+            datas = []
+            # next files are read and parsed while current one is measured
+            for data in loader.load(_samples()[sample], compute=compute, pool=pool):
+                if compute is None:
+                    data = session.measure(data=data)
+                else:
+                    session._print_measure(data)
+                session.plot(data)
+                session.write_file(data)
+                datas.append(data)
+            means = session.mean(*datas, sample=sample)
+            decay_length.print_decay_lengths(session.decay_lengths(*datas))
+            session.write_file(means)
+            session.plot(means)
+            answer = input("quit? [q]: ")
+            if answer == "q":
+                break
+
 
-    """
-    while True:
-        print("Choose sample: ")
-        sample = _choice(sorted(list(_samples().keys()), key=_human_sort))
-        datas = []
-        for datafile in sorted(_samples()[sample], key=_human_sort):
-            data = measure(datafile=datafile)
-            plot(data)
-            write_file(data)
-            datas.append(data)
-        means = mean(*datas, sample=sample)
-        write_file(means)
-        plot(means)
-        answer = input("quit? [q]: ")
-        if answer == "q":
-            break
-
-
-# Initialize values on loading the module
-bad_points = int(input("Bad points: "))  # first points in data is bad
-ions, parameters = set_parameters()
-ion_names = list(map(_strip_ion_name, ions))
-spline_dots = int(input("Dots for spline: "))
 border = "*" * 30
 
 
@@ -0,0 +1,55 @@
+"""
+File: test_chunked.py
+Author: AleNriG
+Email: agorokhov94@gmail.com
+Github: https://github.com/alenrig
+Description: Streamed measure must give the same doses and moments as the
+in-memory Session.measure(), with constant speed and with speed calibration.
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import statistics  # noqa: E402
+
+CHUNK_SIZE = 7  # several blocks and a block border inside bad points
+BAD_POINTS = 3
+RESULTS = ("dose", "Rp", "ΔRp", "γ", "β")
+PARAMETERS = {"matrix": "30Si", "11B IA": 0.8, "11B RSF": 1e21, "cache": None}
+CALIBRATION = dict(
+    ion="11B", matrix="30Si", ratio=np.array([0.0, 1.0]), speed=np.array([0.4, 0.8])
+)
+
+
+@pytest.fixture
+def datafile(tmp_path):
+    """Synthetic file.csv of a boron implant in silicon."""
+    time = np.arange(1, 101, 1.0)
+    boron = 1e3 * np.exp(-(((time - 40) / 12) ** 2)) + 5
+    boron[:BAD_POINTS] = 5e3  # surface transient
+    silicon = 1e4 + 10 * np.sin(time)
+    path = tmp_path / "sample-1_B.csv"
+    with open(path, "w") as file:
+        file.write("time,11B,30Si\n")
+        np.savetxt(file, np.column_stack([time, boron, silicon]), delimiter=",")
+    return str(path)
+
+
+@pytest.mark.parametrize(
+    "calibration, speed",
+    [(None, 0.5), (CALIBRATION, 0.5), (CALIBRATION, None)],
+    ids=["speed", "speed over calibration", "calibration"],
+)
+def test_chunked_measure_matches_measure(datafile, calibration, speed):
+    parameters = dict(PARAMETERS)
+    if calibration is not None:
+        parameters["speed calibration"] = calibration
+    session = statistics.Session(["11B"], parameters, bad_points=BAD_POINTS)
+    expected = session.measure(datafile, speed=speed)
+    result = session.measure_chunked(datafile, speed=speed, chunk_size=CHUNK_SIZE)
+    for name in RESULTS:
+        assert result["B " + name] == pytest.approx(expected["B " + name], rel=1e-12)
@@ -0,0 +1,49 @@
+"""
+File: test_import.py
+Author: AleNriG
+Email: agorokhov94@gmail.com
+Github: https://github.com/alenrig
+Description: Import of statistics must stay light: only NumPy is loaded,
+SciPy, matplotlib and pandas are imported on the first plot.
+"""
+import os
+import subprocess
+import sys
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("pandas", "scipy", "matplotlib")
+IMPORT_TIME_LIMIT = 1.0  # seconds, NumPy alone takes about 0.1
+
+SCRIPT = """
+import sys
+import time
+
+start = time.perf_counter()
+import statistics
+print(time.perf_counter() - start)
+print(statistics.__file__)
+print(*sorted(name for name in sys.modules if name.split(".")[0] in {}))
+""".format(set(HEAVY_MODULES))
+
+
+def _import_statistics():
+    """Import statistics in a clean interpreter from the repository root.
+
+    :returns: import time, module file, list of loaded heavy modules.
+
+    """
+    output = subprocess.run(
+        [sys.executable, "-c", SCRIPT],
+        cwd=ROOT_PATH,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout.splitlines()
+    return float(output[0]), output[1], output[2].split()
+
+
+def test_statistics_import_is_light():
+    elapsed, module_file, heavy = _import_statistics()
+    assert os.path.dirname(module_file) == ROOT_PATH
+    assert heavy == []
+    assert elapsed < IMPORT_TIME_LIMIT